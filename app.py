@@ -1,7 +1,21 @@
+import os
+import sys
+
 from flask import Flask, render_template
 from flask_login import LoginManager
 
-from models import db, User
+from models import db
+from database import init_db, database_url, SQLITE_PRAGMAS
+from chart_cache import chart_cache
+from session_cache import session_users
+from metrics import request_metrics
+from availability import availability_index
+from first_available import first_available
+from jobs import job_queue, run_jobs_command
+import tasks  # registers the background jobs
+from migrations import run_migrations
+from export import export_appointments_command
+from importer import import_data_command
 
 from routes.auth import auth, bcrypt
 from routes.admin import admin
@@ -12,22 +26,105 @@ from routes.restapi import api_bp
 
 login_manager = LoginManager()
 
-def create_app():
+def create_app(config=None):
     app = Flask(__name__)
-    app.secret_key = 'app_secret_key'
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///hospital.db'
+    # set both in production; the fallbacks are for local development
+    app.secret_key = os.environ.get('SECRET_KEY', 'app_secret_key')
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url(os.environ.get('DATABASE_URL', 'sqlite:///hospital.db'))
+
+    # length of a bookable appointment slot, in minutes
+    app.config['APPOINTMENT_SLOT_MINUTES'] = 30
+
+    # rows per page for list views and the api (?limit= is capped at the max)
+    app.config['PAGE_SIZE'] = 50
+    app.config['MAX_PAGE_SIZE'] = 500
+
+    # most results a doctor/patient search returns
+    app.config['SEARCH_LIMIT'] = 100
+
+    # processes hashing passwords during bulk import (None = one per cpu)
+    app.config['IMPORT_WORKERS'] = None
+
+    # most operations accepted by /api/appointments/batch
+    app.config['MAX_BATCH_SIZE'] = 1000
+
+    # times a booking is retried while the database is locked by another writer
+    app.config['BOOKING_RETRIES'] = 5
+
+    # 'client': pages carry chart data and the browser draws it with plotly;
+    # 'server': matplotlib pngs, for clients without javascript
+    app.config['CHART_RENDERER'] = 'client'
+
+    # dates of availability windows kept in the in-memory interval index for
+    # /api/availability/free; also the longest range one request may search
+    app.config['AVAILABILITY_INDEX_MAX_DAYS'] = 120
+
+    # "first available" search per department: days ahead it looks, most slots
+    # it returns, and the per-department result cache (see first_available.py)
+    app.config['FIRST_AVAILABLE_DAYS'] = 14
+    app.config['FIRST_AVAILABLE_MAX'] = 20
+    app.config['FIRST_AVAILABLE_CACHE_SIZE'] = 64
+    app.config['FIRST_AVAILABLE_CACHE_TTL'] = 300
+
+    # background jobs (jobs.py): worker threads per process (0 = none, run
+    # `flask --app app run-jobs` instead), attempts before a job is marked
+    # failed, how long a worker may hold a job before another takes it over,
+    # and how often idle workers look for jobs queued by other processes
+    app.config['JOB_WORKERS'] = 2
+    app.config['JOB_MAX_ATTEMPTS'] = 3
+    app.config['JOB_LEASE_SECONDS'] = 300
+    app.config['JOB_POLL_SECONDS'] = 5
+
+    # under asgi.py, serve the read endpoints of the api with the async
+    # handlers (False: everything goes through the flask app), and the
+    # threads that run flask views there
+    app.config['ASYNC_API'] = True
+    app.config['ASGI_WSGI_THREADS'] = 10
+
+    # ETags and 304s on read-mostly views, see http_cache.py
+    app.config['HTTP_CACHE_ENABLED'] = True
+
+    # per-endpoint metrics at /admin/metrics; statements slower than this (ms) are logged
+    app.config['METRICS_ENABLED'] = True
+    app.config['SLOW_QUERY_MS'] = 200
+
+    # database connections (see database.py); pool settings are unset so the
+    # driver defaults apply unless the environment provides them
+    app.config['DB_POOL_SIZE'] = None
+    app.config['DB_MAX_OVERFLOW'] = None
+    app.config['DB_POOL_TIMEOUT'] = None
+    app.config['DB_POOL_RECYCLE'] = None
+    app.config['DB_POOL_PRE_PING'] = None
+    # longest a single statement may run, in ms (None = no limit)
+    app.config['DB_STATEMENT_TIMEOUT'] = None
+    app.config['SQLITE_PRAGMAS'] = dict(SQLITE_PRAGMAS)
+
+    # deployment settings from FLASK_* environment variables, e.g.
+    # FLASK_DB_POOL_SIZE=20 or FLASK_SQLITE_PRAGMAS__busy_timeout=10000
+    app.config.from_prefixed_env()
+
+    # overrides, e.g. a throwaway database for benchmarks
+    if config:
+        app.config.update(config)
 
     # initailize instances
-    db.init_app(app)
+    init_db(app)
     bcrypt.init_app(app)
     login_manager.init_app(app)
+    chart_cache.init_app(app)
+    session_users.init_app(app)
+    request_metrics.init_app(app)
+    availability_index.init_app(app)
+    first_available.init_app(app)
+    job_queue.init_app(app)
     login_manager.login_view = 'auth.login'
 
 
-    # this function is used by flask-login to reload the user object from the user ID stored in the session
+    # this function is used by flask-login to reload the user object from the user ID stored in the session.
+    # it returns a cached snapshot, see session_cache.py
     @login_manager.user_loader
     def load_user(user_id):
-        return User.query.get(int(user_id))
+        return session_users.get(int(user_id))
 
     # register routes
     app.register_blueprint(auth, url_prefix='/auth')
@@ -40,20 +137,27 @@ def create_app():
 
 
 
+    # cli: flask --app app export-appointments / import-data / run-jobs
+    app.cli.add_command(export_appointments_command)
+    app.cli.add_command(import_data_command)
+    app.cli.add_command(run_jobs_command)
+
+    # Home for all users
+    @app.route('/')
+    def landing_page():
+        return render_template('home.html')
+
     # create db tables if they don't exist
     with app.app_context():  
         db.create_all()
-        print('Database Created Successfully !!')
+        run_migrations(db.engine)
+        # stderr, so cli commands can stream data to stdout
+        print('Database Created Successfully !!', file=sys.stderr)
 
     return app
 
-app = create_app()
-
-# Home for all users
-@app.route('/')
-def landing_page():
-    return render_template('home.html') 
-
 
+# importing this module only defines the factory (`flask --app app` finds it);
+# servers load the app from wsgi.py / asgi.py
 if __name__ == '__main__':
-    app.run(debug=True)
+    create_app().run(debug=True)
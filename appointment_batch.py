@@ -0,0 +1,179 @@
+# batch create/update/delete of appointments in one transaction.
+# every lookup is done up front with one query per kind (appointments by id,
+# users by id, booked slots), then operations are checked in order against an
+# in-memory view of which (doctor, time) slots are taken, so later operations
+# see the effect of earlier ones in the same batch. the unit of work does not
+# write in batch order, so before an operation books a slot that an earlier one
+# freed the pending changes are flushed, and the unique index never sees the
+# new booking ahead of the change that made room for it.
+from datetime import datetime
+
+from models import db, User, Appointment
+
+OPERATIONS = ('create', 'update', 'delete')
+STATUSES = ('Booked', 'Completed', 'Cancelled')
+
+
+class BatchError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _parse_datetime(value):
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise BatchError(400, f'invalid datetime {value!r}')
+
+
+def _parse_id(op, field):
+    value = op.get(field)
+    if value is None:
+        raise BatchError(400, f'{field} is required')
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise BatchError(400, f'{field} must be an integer')
+    return value
+
+
+def _parse(op):
+    if not isinstance(op, dict) or op.get('op') not in OPERATIONS:
+        raise BatchError(400, f"op must be one of {', '.join(OPERATIONS)}")
+
+    parsed = {'op': op['op']}
+    if op['op'] == 'create':
+        parsed['doctor_id'] = _parse_id(op, 'doctor_id')
+        parsed['patient_id'] = _parse_id(op, 'patient_id')
+        if op.get('datetime') is None:
+            raise BatchError(400, 'datetime is required')
+        parsed['datetime'] = _parse_datetime(op['datetime'])
+        parsed['reason'] = op.get('reason')
+        return parsed
+
+    parsed['id'] = _parse_id(op, 'id')
+    if op['op'] == 'update':
+        if 'status' in op and op['status'] not in STATUSES:
+            raise BatchError(400, f"status must be one of {', '.join(STATUSES)}")
+        parsed['status'] = op.get('status')
+        parsed['datetime'] = _parse_datetime(op['datetime']) if op.get('datetime') else None
+    return parsed
+
+
+# (doctor_id, datetime) -> appointment id for every booked slot the batch could touch (one query)
+def _booked_slots(doctor_ids, times):
+    if not doctor_ids or not times:
+        return {}
+    rows = db.session.query(Appointment.doctor_id, Appointment.appointment_datetime, Appointment.id).filter(
+        Appointment.status == 'Booked',
+        Appointment.doctor_id.in_(doctor_ids),
+        Appointment.appointment_datetime.in_(times),
+    )
+    return {(doctor_id, when): appt_id for doctor_id, when, appt_id in rows}
+
+
+# apply a list of operations; returns one result dict per operation, in order.
+# with atomic=True nothing is written unless every operation succeeds.
+def apply_batch(operations, atomic=False):
+    results = [None] * len(operations)
+    parsed = {}
+    for i, op in enumerate(operations):
+        try:
+            parsed[i] = _parse(op)
+        except BatchError as e:
+            results[i] = {'index': i, 'status': e.status, 'error': str(e)}
+
+    # everything the batch refers to, loaded up front
+    ids = {op['id'] for op in parsed.values() if 'id' in op}
+    appointments = {a.id: a for a in Appointment.query.filter(Appointment.id.in_(ids))} if ids else {}
+
+    user_ids = {op[f] for op in parsed.values() if op['op'] == 'create' for f in ('doctor_id', 'patient_id')}
+    roles = dict(db.session.query(User.id, User.role).filter(User.id.in_(user_ids))) if user_ids else {}
+
+    doctor_ids = {op['doctor_id'] for op in parsed.values() if op['op'] == 'create'}
+    doctor_ids |= {a.doctor_id for a in appointments.values()}
+    times = {op['datetime'] for op in parsed.values() if op.get('datetime')}
+    times |= {a.appointment_datetime for a in appointments.values()}
+    taken = _booked_slots(doctor_ids, times)
+    vacated = set()     # slots freed by changes not flushed yet
+
+    for i, op in parsed.items():
+        try:
+            results[i] = _apply(i, op, appointments, roles, taken, vacated)
+        except BatchError as e:
+            results[i] = {'index': i, 'status': e.status, 'error': str(e)}
+
+    failed = any(r['status'] >= 400 for r in results)
+    if atomic and failed:
+        db.session.rollback()
+        for r in results:
+            if r['status'] < 400:
+                r.update(status=424, error='not applied, another operation in the batch failed')
+                r.pop('id', None)
+                r.pop('appointment', None)
+        return results
+
+    db.session.flush()
+    for r in results:
+        if 'appointment' in r:
+            r['id'] = r.pop('appointment').id
+    db.session.commit()
+    return results
+
+
+# booking a slot an unflushed change freed: write that change first
+def _book(slot, vacated):
+    if slot in vacated:
+        db.session.flush()
+        vacated.clear()
+
+
+def _apply(i, op, appointments, roles, taken, vacated):
+    if op['op'] == 'create':
+        if roles.get(op['doctor_id']) != 'doctor':
+            raise BatchError(404, 'doctor not found')
+        if roles.get(op['patient_id']) != 'patient':
+            raise BatchError(404, 'patient not found')
+        slot = (op['doctor_id'], op['datetime'])
+        if slot in taken:
+            raise BatchError(409, 'that time slot is already booked')
+
+        _book(slot, vacated)
+        appt = Appointment(doctor_id=op['doctor_id'], patient_id=op['patient_id'],
+                           appointment_datetime=op['datetime'], reason=op['reason'], status='Booked')
+        db.session.add(appt)
+        taken[slot] = appt
+        return {'index': i, 'status': 201, 'appointment': appt}
+
+    appt = appointments.get(op['id'])
+    if appt is None:
+        raise BatchError(404, 'appointment not found')
+    old_slot = (appt.doctor_id, appt.appointment_datetime)
+
+    if op['op'] == 'delete':
+        if appt.status == 'Booked':
+            taken.pop(old_slot, None)
+            vacated.add(old_slot)
+        db.session.delete(appt)
+        del appointments[op['id']]
+        return {'index': i, 'status': 200, 'id': op['id']}
+
+    status = op['status'] or appt.status
+    new_slot = (appt.doctor_id, op['datetime'] or appt.appointment_datetime)
+    if status == 'Booked':
+        # holders are ids for stored appointments, objects for ones created in this batch
+        holder = taken.get(new_slot)
+        if holder is not None and holder is not appt and holder != appt.id:
+            raise BatchError(409, 'that time slot is already booked')
+
+    keeps_slot = appt.status == 'Booked' and status == 'Booked' and new_slot == old_slot
+    if status == 'Booked' and not keeps_slot:
+        _book(new_slot, vacated)
+    if appt.status == 'Booked':
+        taken.pop(old_slot, None)
+        if not keeps_slot:
+            vacated.add(old_slot)
+    appt.status = status
+    appt.appointment_datetime = new_slot[1]
+    if status == 'Booked':
+        taken[new_slot] = appt
+    return {'index': i, 'status': 200, 'id': appt.id}
@@ -0,0 +1,177 @@
+# asgi entry point, alongside wsgi.py:
+#   uvicorn asgi:application --workers 4
+# GET /api/doctors, /api/patients and /api/appointments are answered by async
+# handlers on an async engine (aiosqlite, asyncpg), so many concurrent,
+# mostly idle kiosk and mobile connections wait on one event loop instead of
+# each holding a worker thread. the responses - bodies, cursor pagination,
+# ETags and 304s - are the same as api_bp's. every other request (writes, html
+# pages, the rest of the api) goes to the flask app through a2wsgi, which
+# runs it on a thread pool.
+# needs uvicorn, a2wsgi and aiosqlite, pinned in requirements.txt (asyncpg for postgres)
+import hashlib
+from urllib.parse import parse_qsl, urlencode
+
+from a2wsgi import WSGIMiddleware
+from sqlalchemy import select
+
+from wsgi import app as flask_app
+from change_tracker import table_versions
+from database import create_async_engine_for
+from models import User
+from pagination import keyset_query
+from queries import APPOINTMENT_ORDER, NAME_ORDER
+from serializers import dumps, DOCTOR, PATIENT, APPOINTMENT
+
+engine = create_async_engine_for(flask_app)
+wsgi = WSGIMiddleware(flask_app, workers=flask_app.config['ASGI_WSGI_THREADS'])
+
+
+class Request:
+    def __init__(self, scope):
+        self.method = scope['method']
+        self.path = scope['path']
+        self.query_string = scope['query_string'].decode('latin-1')
+        self.args = {}
+        for name, value in parse_qsl(self.query_string, keep_blank_values=True):
+            self.args.setdefault(name, value)   # first value wins, as in flask
+        self.headers = {name.decode('latin-1'): value.decode('latin-1') for name, value in scope['headers']}
+
+    # werkzeug's Request.full_path, part of the ETag
+    @property
+    def full_path(self):
+        return f'{self.path}?{self.query_string}'
+
+
+class BadRequest(Exception):
+    pass
+
+
+# ---------------------------- handlers ----------------------------------------
+
+async def _page(conn, request, query, order):
+    config = flask_app.config
+    default, maximum = config.get('PAGE_SIZE', 50), config.get('MAX_PAGE_SIZE', 500)
+    try:
+        limit = int(request.args.get('limit', default))
+    except ValueError:
+        limit = default
+    limit = max(1, min(limit, maximum))
+    try:
+        query, page = keyset_query(query, order, request.args.get('cursor'), limit)
+    except ValueError:
+        raise BadRequest({'message': 'Invalid pagination cursor.'})
+    return page((await conn.execute(query)).all())
+
+
+# X-Next-Cursor / X-Prev-Cursor and Link, like pagination.Page.headers
+def _page_headers(request, page):
+    headers, links = {}, []
+    for rel, cursor in (('next', page.next_cursor), ('prev', page.prev_cursor)):
+        if cursor:
+            headers[f'X-{rel.capitalize()}-Cursor'] = cursor
+            links.append(f'<{request.path}?{urlencode({**request.args, "cursor": cursor})}>; rel="{rel}"')
+    if links:
+        headers['Link'] = ', '.join(links)
+    return headers
+
+
+# the same fields and columns as api_bp's serialized_page
+async def _serialized_page(conn, request, fields, order, *criteria):
+    try:
+        names = fields.parse(request.args.get('fields'))
+    except ValueError as e:
+        raise BadRequest({'error': str(e)})
+    columns = fields.columns(names, order)
+    page = await _page(conn, request, select(*columns).where(*criteria), order)
+    return fields.dicts(page, names, columns), page
+
+
+async def doctors(conn, request):
+    return await _serialized_page(conn, request, DOCTOR, NAME_ORDER, User.role == 'doctor')
+
+
+async def patients(conn, request):
+    return await _serialized_page(conn, request, PATIENT, NAME_ORDER, User.role == 'patient')
+
+
+async def appointments(conn, request):
+    return await _serialized_page(conn, request, APPOINTMENT, APPOINTMENT_ORDER)
+
+
+# path -> (handler, flask endpoint, tables for the ETag, Cache-Control), as in routes/restapi.py
+ROUTES = {
+    '/api/doctors': (doctors, 'api.doctorlist', ('users',), 'public, max-age=60'),
+    '/api/patients': (patients, 'api.patientlist', ('users',), 'private, no-cache'),
+    '/api/appointments': (appointments, 'api.appointmentapi', None, None),
+}
+
+
+# ---------------------------- conditional GETs --------------------------------
+
+# the same ETag http_cache computes, so a client may switch entry points
+async def _etag(conn, request, endpoint, tables):
+    rows = await conn.execute(
+        select(table_versions.c.table_name, table_versions.c.version)
+        .where(table_versions.c.table_name.in_(tables))
+    )
+    found = dict(rows.all())
+    key = [endpoint, request.full_path, [found.get(t, 0) for t in tables]]
+    return hashlib.sha1(repr(key).encode('utf-8')).hexdigest()[:20]
+
+
+def _not_modified(request, etag):
+    if 'if-none-match' not in request.headers:
+        return False
+    tags = [tag.strip().removeprefix('W/') for tag in request.headers['if-none-match'].split(',')]
+    return '*' in tags or f'"{etag}"' in tags
+
+
+# ---------------------------- asgi plumbing -----------------------------------
+
+async def _respond(send, request, status, data=None, headers=None):
+    body, raw = b'', []
+    if data is not None:
+        body = dumps(data)
+        raw = [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]
+    raw += [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in (headers or {}).items()]
+    await send({'type': 'http.response.start', 'status': status, 'headers': raw})
+    await send({'type': 'http.response.body', 'body': body if request.method != 'HEAD' else b''})
+
+
+async def _api(scope, receive, send, route):
+    handler, endpoint, tables, cache_control = route
+    request = Request(scope)
+    async with engine.connect() as conn:
+        headers = {}
+        if tables and flask_app.config.get('HTTP_CACHE_ENABLED', True):
+            etag = await _etag(conn, request, endpoint, tables)
+            headers = {'ETag': f'W/"{etag}"', 'Cache-Control': cache_control}
+            if _not_modified(request, etag):
+                return await _respond(send, request, 304, headers=headers)
+        try:
+            data, page = await handler(conn, request)
+        except BadRequest as e:
+            return await _respond(send, request, 400, e.args[0])
+    await _respond(send, request, 200, data, {**_page_headers(request, page), **headers})
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await engine.dispose()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await _lifespan(receive, send)
+
+    route = ROUTES.get(scope.get('path'))
+    if (route and scope['type'] == 'http' and scope['method'] in ('GET', 'HEAD')
+            and flask_app.config.get('ASYNC_API', True)):
+        return await _api(scope, receive, send, route)
+    return await wsgi(scope, receive, send)
@@ -0,0 +1,248 @@
+# doctor availability: normalised windows and a cross-doctor interval index.
+# windows are merged on write, so a doctor never has two overlapping or
+# touching windows on the same date and slots are cut from one clean grid.
+# AvailabilityIndex keeps an interval tree of every doctor's windows per date,
+# so "who is free at T / between A and B" checks a handful of tree nodes
+# instead of every doctor; bookings are read live for the matching doctors.
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+from operator import itemgetter
+
+from sqlalchemy import bindparam, delete, select, update
+from sqlalchemy.orm import joinedload
+
+import change_tracker
+from models import db, User, DoctorAvailability
+from slots import slot_length, booked_times_for, merge_windows, subtract_booked
+
+_table = DoctorAvailability.__table__
+
+
+# add a window for a doctor and date, absorbing any it overlaps or touches.
+# returns (row, merged); the caller commits
+def add_window(doctor_id, day, start, end):
+    touching = DoctorAvailability.query.filter(
+        DoctorAvailability.doctor_id == doctor_id,
+        DoctorAvailability.available_date == day,
+        DoctorAvailability.start_time <= end,
+        DoctorAvailability.end_time >= start,
+    ).order_by(DoctorAvailability.start_time).all()
+
+    if not touching:
+        row = DoctorAvailability(doctor_id=doctor_id, available_date=day, start_time=start, end_time=end)
+        db.session.add(row)
+        return row, False
+
+    row = touching[0]
+    row.start_time = min(start, row.start_time)
+    row.end_time = max([end] + [other.end_time for other in touching])
+    for other in touching[1:]:
+        db.session.delete(other)
+    return row, True
+
+
+# merge overlapping or touching rows in place: the first row of each merged
+# window is kept and stretched, the rest are deleted. with doctor_ids, only
+# those doctors. works on a plain connection so migrations and bulk imports can
+# use it; returns how many rows were absorbed
+def normalise(conn, doctor_ids=None, chunk=500):
+    if doctor_ids is None:
+        return _normalise(conn, None)
+    doctor_ids = sorted(doctor_ids)
+    return sum(_normalise(conn, doctor_ids[i:i + chunk]) for i in range(0, len(doctor_ids), chunk))
+
+
+def _normalise(conn, doctor_ids):
+    query = select(_table.c.id, _table.c.doctor_id, _table.c.available_date,
+                   _table.c.start_time, _table.c.end_time)
+    if doctor_ids is not None:
+        query = query.where(_table.c.doctor_id.in_(doctor_ids))
+    rows = conn.execute(query.order_by(_table.c.doctor_id, _table.c.available_date, _table.c.start_time))
+
+    updates, deletes = [], []
+    keep = None     # [id, doctor_id, date, end, stretched] of the window being grown
+    for row_id, doctor_id, day, start, end in rows:
+        if keep and keep[1] == doctor_id and keep[2] == day and start <= keep[3]:
+            deletes.append({'row_id': row_id})
+            if end > keep[3]:
+                keep[3], keep[4] = end, True
+            continue
+        if keep and keep[4]:
+            updates.append({'row_id': keep[0], 'new_end': keep[3]})
+        keep = [row_id, doctor_id, day, end, False]
+    if keep and keep[4]:
+        updates.append({'row_id': keep[0], 'new_end': keep[3]})
+
+    if updates:
+        conn.execute(update(_table).where(_table.c.id == bindparam('row_id')).values(end_time=bindparam('new_end')),
+                     updates)
+    if deletes:
+        conn.execute(delete(_table).where(_table.c.id == bindparam('row_id')), deletes)
+    return len(deletes)
+
+
+# ---------------------------- interval index ----------------------------------
+
+class IntervalTree:
+    """Centered interval tree over half-open [start, end) intervals with a value."""
+
+    __slots__ = ('center', 'by_start', 'by_end', 'left', 'right')
+
+    def __init__(self, intervals):
+        points = sorted(p for start, end, _ in intervals for p in (start, end))
+        # the lower median always leaves at least one interval at this node
+        self.center = points[(len(points) - 1) // 2]
+        here, left, right = [], [], []
+        for interval in intervals:
+            if interval[1] <= self.center:
+                left.append(interval)
+            elif interval[0] > self.center:
+                right.append(interval)
+            else:
+                here.append(interval)
+        self.by_start = sorted(here, key=itemgetter(0))
+        self.by_end = sorted(here, key=itemgetter(1), reverse=True)
+        self.left = IntervalTree(left) if left else None
+        self.right = IntervalTree(right) if right else None
+
+    # intervals containing point
+    def at(self, point):
+        node = self
+        while node is not None:
+            if point < node.center:
+                for interval in node.by_start:
+                    if interval[0] > point:
+                        break
+                    yield interval
+                node = node.left
+            else:
+                for interval in node.by_end:
+                    if interval[1] <= point:
+                        break
+                    yield interval
+                node = node.right
+
+    # intervals overlapping [start, end)
+    def overlapping(self, start, end):
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if start >= node.center:
+                for interval in node.by_end:
+                    if interval[1] <= start:
+                        break
+                    yield interval
+                if node.right:
+                    stack.append(node.right)
+            elif end <= node.center:
+                for interval in node.by_start:
+                    if interval[0] >= end:
+                        break
+                    yield interval
+                if node.left:
+                    stack.append(node.left)
+            else:
+                yield from node.by_start
+                stack.extend(n for n in (node.left, node.right) if n)
+
+
+class AvailabilityIndex:
+    def __init__(self, max_days=120):
+        self.max_days = max_days
+        self._version = None
+        self._trees = {}        # date -> IntervalTree of (start, end, doctor_id), None if nobody works
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.max_days = app.config.setdefault('AVAILABILITY_INDEX_MAX_DAYS', self.max_days)
+
+    # trees for the given dates; missing dates are loaded with one query
+    def _trees_for(self, days):
+        version = change_tracker.version(DoctorAvailability.__tablename__)
+        with self._lock:
+            if version != self._version or len(self._trees) > self.max_days:
+                self._trees, self._version = {}, version
+            trees = {day: self._trees[day] for day in days if day in self._trees}
+        missing = [day for day in days if day not in trees]
+        if not missing:
+            return trees
+
+        windows = defaultdict(lambda: defaultdict(list))
+        rows = db.session.query(
+            DoctorAvailability.doctor_id, DoctorAvailability.available_date,
+            DoctorAvailability.start_time, DoctorAvailability.end_time,
+        ).filter(DoctorAvailability.available_date.in_(missing))
+        for doctor_id, day, start, end in rows:
+            windows[day][doctor_id].append((datetime.combine(day, start), datetime.combine(day, end)))
+
+        for day in missing:
+            intervals = [(start, end, doctor_id)
+                         for doctor_id, spans in windows[day].items()
+                         for start, end in merge_windows(spans)]
+            trees[day] = IntervalTree(intervals) if intervals else None
+        with self._lock:
+            if self._version == version:
+                self._trees.update((day, trees[day]) for day in missing)
+        return trees
+
+    # doctor ids free for a whole slot starting at `when`, optionally only among doctor_ids
+    def free_at(self, when, minutes=None, doctor_ids=None):
+        step = timedelta(minutes=minutes or slot_length())
+        tree = self._trees_for([when.date()])[when.date()]
+        if tree is None:
+            return []
+        candidates = {doctor_id for start, end, doctor_id in tree.at(when) if end >= when + step}
+        if doctor_ids is not None:
+            candidates &= set(doctor_ids)
+        if not candidates:
+            return []
+        # a booking overlaps the slot if it starts less than a slot before or after it
+        booked = booked_times_for(candidates, when - step + timedelta(microseconds=1), when + step)
+        return sorted(doctor_id for doctor_id in candidates if not booked.get(doctor_id))
+
+    # {doctor_id: [free slot starts]} for slots that fit in [start, end)
+    def free_between(self, start, end, minutes=None, doctor_ids=None):
+        minutes = minutes or slot_length()
+        days = [start.date() + timedelta(days=i) for i in range((end.date() - start.date()).days + 1)]
+        trees = self._trees_for(days)
+
+        windows = defaultdict(list)     # doctor_id -> [(date, start time, end time)]
+        for day in days:
+            if trees[day] is None:
+                continue
+            for window_start, window_end, doctor_id in trees[day].overlapping(start, end):
+                windows[doctor_id].append((day, window_start.time(), window_end.time()))
+        if doctor_ids is not None:
+            wanted = set(doctor_ids)
+            windows = {d: w for d, w in windows.items() if d in wanted}
+        if not windows:
+            return {}
+
+        step = timedelta(minutes=minutes)
+        booked = booked_times_for(list(windows), start, end)
+        free = {}
+        for doctor_id, doctor_windows in windows.items():
+            by_day = subtract_booked(sorted(doctor_windows), booked.get(doctor_id, []), minutes)
+            slots = [slot for day in sorted(by_day) for slot in by_day[day] if start <= slot and slot + step <= end]
+            if slots:
+                free[doctor_id] = slots
+        return free
+
+    def clear(self):
+        with self._lock:
+            self._trees, self._version = {}, None
+
+
+availability_index = AvailabilityIndex()
+
+
+# doctors (optionally of one department) as {id: User} with their department
+# loaded, for labelling index results
+def doctors_by_id(doctor_ids, department_id=None):
+    if not doctor_ids:
+        return {}
+    query = User.query.options(joinedload(User.specialization)).filter(User.role == 'doctor', User.id.in_(doctor_ids))
+    if department_id is not None:
+        query = query.filter(User.specialization_id == department_id)
+    return {doctor.id: doctor for doctor in query}
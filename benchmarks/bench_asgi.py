@@ -0,0 +1,121 @@
+# concurrent clients against the read api, served three ways: the flask app on
+# a threaded wsgi server (a thread per connection), the flask app behind
+# asgi.py with the async handlers switched off (FLASK_ASYNC_API=false, so
+# a2wsgi's thread pool), and asgi.py's async handlers. each server runs in
+# its own process on the synthetic data; the client keeps N keep-alive
+# connections busy for a few seconds and reports requests/sec and latency.
+# client and server share the machine, so compare the rows, not the absolutes.
+#   python -m benchmarks.bench_asgi
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+from benchmarks.common import make_app, drop_app
+from benchmarks.datagen import generate
+
+URLS = ['/api/doctors?limit=50', '/api/patients?limit=50', '/api/appointments?limit=50']
+CONCURRENCY = (10, 100)
+SECONDS = 5
+PORT = 8765
+
+SERVERS = {
+    'wsgi (threaded)': ('wsgi', {}),
+    'asgi, flask api': ('asgi', {'FLASK_ASYNC_API': 'false'}),
+    'asgi, async api': ('asgi', {}),
+}
+
+
+def serve(kind, port):
+    if kind == 'wsgi':
+        from werkzeug.serving import make_server
+        from wsgi import app
+        make_server('127.0.0.1', port, app, threaded=True).serve_forever()
+    else:
+        import uvicorn
+        uvicorn.run('asgi:application', host='127.0.0.1', port=port, log_level='warning')
+
+
+# a bare keep-alive http/1.1 client: a fixed, small cost per request whatever
+# the number of connections, so the server is what gets measured
+async def _get(connection, url):
+    reader, writer = connection
+    writer.write(f'GET {url} HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n'.encode())
+    head = await reader.readuntil(b'\r\n\r\n')
+    status_line, *lines = head.decode('latin-1').split('\r\n')
+    headers = dict(line.lower().split(': ', 1) for line in lines if line)
+    await reader.readexactly(int(headers.get('content-length', 0)))
+    keep_alive = status_line.startswith('HTTP/1.1') and headers.get('connection') != 'close'
+    return int(status_line.split()[1]), keep_alive
+
+
+async def load(concurrency, seconds):
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + seconds
+
+    async def worker(i):
+        nonlocal errors
+        n, connection = i, None
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            if connection is None:
+                connection = await asyncio.open_connection('127.0.0.1', PORT)
+            status, keep_alive = await _get(connection, URLS[n % len(URLS)])
+            latencies.append(time.perf_counter() - t0)
+            errors += status != 200
+            if not keep_alive:
+                connection[1].close()
+                connection = None
+            n += 1
+        if connection:
+            connection[1].close()
+
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    cuts = statistics.quantiles(latencies, n=100)
+    return len(latencies) / seconds, cuts[49] * 1000, cuts[94] * 1000, errors
+
+
+def wait_for_server(process):
+    for _ in range(100):
+        if process.poll() is not None:
+            raise RuntimeError('server exited')
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{PORT}/api/doctors?limit=1', timeout=1).read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('server did not start')
+
+
+def main():
+    app = make_app()
+    try:
+        with app.app_context():
+            print(generate(20000))
+        env = {**os.environ, 'DATABASE_URL': f'sqlite:///{app.bench_db_path}', 'FLASK_JOB_WORKERS': '0',
+               'FLASK_METRICS_ENABLED': 'false'}
+
+        print(f"{'server':<18} {'clients':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'errors':>6}")
+        for name, (kind, extra) in SERVERS.items():
+            process = subprocess.Popen([sys.executable, '-m', 'benchmarks.bench_asgi', 'serve', kind, str(PORT)],
+                                       env={**env, **extra}, stderr=subprocess.DEVNULL)
+            try:
+                wait_for_server(process)
+                for concurrency in CONCURRENCY:
+                    rate, p50, p95, errors = asyncio.run(load(concurrency, SECONDS))
+                    print(f'{name:<18} {concurrency:>7} {rate:>8.0f} {p50:>8.1f} {p95:>8.1f} {errors:>6}')
+            finally:
+                process.terminate()
+                process.wait()
+    finally:
+        drop_app(app)
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['serve']:
+        serve(sys.argv[2], int(sys.argv[3]))
+    else:
+        main()
@@ -0,0 +1,70 @@
+# front-desk searches across all doctors: "who is free at T" and "free slots
+# between A and B". the old way is a free_slots call (two queries) per doctor;
+# the interval index answers from its in-memory trees plus one bookings query.
+# the cold run includes loading the dates' windows into the index.
+#   python -m benchmarks.bench_availability
+import time
+from datetime import date, datetime, timedelta
+
+from benchmarks.common import make_app, drop_app, QueryCounter
+from benchmarks.datagen import generate, DAY_START
+from availability import availability_index
+from models import db, User
+from slots import free_slots
+
+REPEAT = 20
+
+
+def per_doctor(doctor_ids, start, end):
+    free = {}
+    for doctor_id in doctor_ids:
+        slots = [slot for day_slots in free_slots(doctor_id, start.date(), end.date()).values()
+                 for slot in day_slots if start <= slot < end]
+        if slots:
+            free[doctor_id] = slots
+    return free
+
+
+def timed(engine, fn, repeat):
+    with QueryCounter(engine) as counter:
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            result = fn()
+        elapsed = time.perf_counter() - t0
+    return result, elapsed / repeat * 1000, counter.count / repeat
+
+
+def main():
+    app = make_app()
+    try:
+        with app.app_context():
+            data = generate(20000)
+            engine = db.engine
+            doctor_ids = [i for i, in db.session.query(User.id).filter_by(role='doctor')]
+
+            day = date.today() + timedelta(days=1)
+            while day.weekday() >= 5:
+                day += timedelta(days=1)
+            at = datetime.combine(day, datetime.min.time()) + timedelta(hours=DAY_START + 1)
+            week = (datetime.combine(day, datetime.min.time()), datetime.combine(day + timedelta(days=7), datetime.min.time()))
+            print(f'{data}, {len(doctor_ids)} doctors')
+
+            for label, start, end in (('free at T', at, at + timedelta(minutes=30)), ('free in a week', *week)):
+                naive, naive_ms, naive_q = timed(engine, lambda: per_doctor(doctor_ids, start, end), 3)
+                availability_index.clear()
+                _, cold_ms, cold_q = timed(engine, lambda: availability_index.free_between(start, end), 1)
+                indexed, warm_ms, warm_q = timed(engine, lambda: availability_index.free_between(start, end), REPEAT)
+                assert indexed == naive, label
+                print(f'{label:<15} per doctor {naive_ms:8.1f} ms {naive_q:6.0f} queries   '
+                      f'index cold {cold_ms:7.1f} ms {cold_q:3.0f} queries   warm {warm_ms:6.1f} ms {warm_q:3.0f} queries   '
+                      f'({sum(map(len, indexed.values()))} free slots, {len(indexed)} doctors)')
+
+            free, at_ms, at_q = timed(engine, lambda: availability_index.free_at(at), REPEAT)
+            assert free == sorted(per_doctor(doctor_ids, at, at + timedelta(minutes=30)))
+            print(f'free_at         warm {at_ms:6.2f} ms {at_q:.0f} queries ({len(free)} doctors)')
+    finally:
+        drop_app(app)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+# one POST per appointment vs /api/appointments/batch
+#   python -m benchmarks.bench_batch
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.common import make_app, drop_app
+from models import db, User
+
+
+def seed():
+    doctor = User(email='doc@bench', password='x', first_name='Bench', last_name='Doctor', role='doctor')
+    patient = User(email='pat@bench', password='x', first_name='Bench', last_name='Patient', role='patient')
+    db.session.add_all([doctor, patient])
+    db.session.commit()
+    return doctor.id, patient.id
+
+
+def operations(doctor_id, patient_id, count, offset):
+    start = datetime(2030, 1, 1, 8) + timedelta(days=offset)
+    return [{'op': 'create', 'doctor_id': doctor_id, 'patient_id': patient_id,
+             'datetime': (start + timedelta(minutes=i)).isoformat()} for i in range(count)]
+
+
+def main():
+    count = 1000
+    app = make_app()
+    try:
+        with app.app_context():
+            doctor_id, patient_id = seed()
+        client = app.test_client()
+
+        ops = operations(doctor_id, patient_id, count, 0)
+        t0 = time.perf_counter()
+        for op in ops:
+            client.post('/api/appointments', json={k: op[k] for k in ('doctor_id', 'patient_id', 'datetime')})
+        single = time.perf_counter() - t0
+        print(f'{"single posts":<14} {count / single:>10.0f} appointments/sec')
+
+        for size in (10, 100, 1000):
+            ops = operations(doctor_id, patient_id, count, size)
+            t0 = time.perf_counter()
+            for i in range(0, count, size):
+                response = client.post('/api/appointments/batch', json={'operations': ops[i:i + size]})
+                assert all(r['status'] == 201 for r in response.json['results'])
+            elapsed = time.perf_counter() - t0
+            print(f'{"batch of " + str(size):<14} {count / elapsed:>10.0f} appointments/sec')
+    finally:
+        drop_app(app)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+# many threads booking the same few slots at once: the old check-then-insert
+# against booking.reserve_slot. afterwards no (doctor, time) may hold more than
+# one booked appointment.
+#   python -m benchmarks.bench_booking
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+
+from benchmarks.common import make_app, drop_app
+from booking import reserve_slot, SlotUnavailable
+from models import db, User, Appointment
+
+THREADS = 16
+SLOTS = 20
+
+
+def seed():
+    doctor = User(email='doc@bench', password='x', first_name='Bench', last_name='Doctor', role='doctor')
+    patients = [User(email=f'pat{i}@bench', password='x', first_name='Bench', last_name=f'Patient{i}',
+                     role='patient') for i in range(THREADS)]
+    db.session.add_all([doctor] + patients)
+    db.session.commit()
+    return doctor.id, [p.id for p in patients]
+
+
+# the pre-fix booking flow: look for a conflict, then insert
+def check_then_insert(patient_id, doctor_id, when):
+    conflict = Appointment.query.filter_by(doctor_id=doctor_id, appointment_datetime=when, status='Booked').first()
+    if conflict:
+        raise SlotUnavailable('That time slot is already booked.')
+    time.sleep(0.001)   # request handling between the check and the write
+    db.session.add(Appointment(patient_id=patient_id, doctor_id=doctor_id, appointment_datetime=when,
+                               status='Booked', created_at=datetime.utcnow()))
+    db.session.commit()
+
+
+def double_bookings():
+    return db.session.query(Appointment.doctor_id, Appointment.appointment_datetime).filter(
+        Appointment.status == 'Booked'
+    ).group_by(Appointment.doctor_id, Appointment.appointment_datetime).having(func.count() > 1).count()
+
+
+def run(app, book, doctor_id, patient_ids):
+    times = [datetime(2030, 1, 1, 9) + timedelta(minutes=30 * i) for i in range(SLOTS)]
+    counts = {'booked': 0, 'rejected': 0, 'failed': 0}
+    lock = threading.Lock()
+    barrier = threading.Barrier(THREADS)
+
+    def worker(patient_id):
+        with app.app_context():
+            barrier.wait()
+            for when in times:
+                try:
+                    book(patient_id, doctor_id, when)
+                    outcome = 'booked'
+                except SlotUnavailable:
+                    outcome = 'rejected'
+                except Exception:
+                    db.session.rollback()
+                    outcome = 'failed'
+                with lock:
+                    counts[outcome] += 1
+
+    threads = [threading.Thread(target=worker, args=(p,)) for p in patient_ids]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    return counts, elapsed
+
+
+def main():
+    for label, unique_index, book in (
+        ('check-then-insert', False, check_then_insert),
+        ('reserve_slot', True, reserve_slot),
+    ):
+        app = make_app()
+        try:
+            with app.app_context():
+                if not unique_index:
+                    db.session.execute(db.text('DROP INDEX uq_appointments_booked_slot'))
+                    db.session.commit()
+                doctor_id, patient_ids = seed()
+            counts, elapsed = run(app, book, doctor_id, patient_ids)
+            with app.app_context():
+                doubles = double_bookings()
+            print(f'{label:<18} {elapsed * 1000:>8.0f} ms  booked={counts["booked"]} '
+                  f'rejected={counts["rejected"]} failed={counts["failed"]} double-booked slots={doubles}')
+            if unique_index:
+                assert doubles == 0, 'reserve_slot let a slot be booked twice'
+                assert counts['booked'] == SLOTS
+        finally:
+            drop_app(app)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+# chart rendering from many threads: the old pyplot state machine against
+# chart.draw (one Figure per chart). every image drawn concurrently must be
+# identical to the same chart drawn alone.
+#   python -m benchmarks.bench_charts
+import base64
+import threading
+import time
+from io import BytesIO
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+
+from chart import draw, draw_all
+
+THREADS = 8
+ROUNDS = 5
+
+
+def specs():
+    charts = []
+    for i in range(THREADS):
+        if i % 2:
+            charts.append({'type': 'pie', 'title': f'Pie {i}', 'labels': ['a', 'b', 'c'], 'values': [i, i + 1, 3]})
+        else:
+            charts.append({'type': 'bar', 'title': f'Bar {i}', 'labels': list('mtwtfss'),
+                           'values': [(i * d) % 7 for d in range(7)], 'color': 'orange'})
+    return charts
+
+
+# the pre-Figure implementation, kept here for comparison
+def draw_pyplot(spec):
+    if spec['type'] == 'pie':
+        plt.figure(figsize=(4, 4))
+        plt.pie(spec['values'], labels=spec['labels'], autopct='%1.1f%%', startangle=90)
+    else:
+        x = list(range(len(spec['labels'])))
+        plt.figure(figsize=(5, 3))
+        plt.bar(x, spec['values'], color=spec.get('color'))
+        plt.xticks(x, spec['labels'])
+    plt.title(spec['title'])
+    buffer = BytesIO()
+    plt.savefig(buffer, format='png', bbox_inches='tight')
+    plt.close()
+    return base64.b64encode(buffer.getvalue()).decode('utf-8')
+
+
+def concurrent(render, charts):
+    expected = [render(spec) for spec in charts]
+    wrong = errors = 0
+    lock = threading.Lock()
+    barrier = threading.Barrier(len(charts))
+
+    def worker(i):
+        nonlocal wrong, errors
+        barrier.wait()
+        for _ in range(ROUNDS):
+            try:
+                ok = render(charts[i]) == expected[i]
+            except Exception:
+                with lock:
+                    errors += 1
+                continue
+            with lock:
+                wrong += not ok
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(len(charts))]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - t0, wrong, errors
+
+
+def main():
+    charts = specs()
+    total = len(charts) * ROUNDS
+
+    for label, render in (('pyplot', draw_pyplot), ('Figure', draw)):
+        elapsed, wrong, errors = concurrent(render, charts)
+        print(f'{label:<8} {THREADS} threads: {total / elapsed:6.1f} charts/sec, '
+              f'{wrong} mixed-up images, {errors} exceptions')
+        if render is draw:
+            assert wrong == 0 and errors == 0, 'Figure rendering is not thread-safe'
+
+    for reuse in (False, True):
+        t0 = time.perf_counter()
+        for _ in range(ROUNDS):
+            draw_all(charts, reuse_buffer=reuse)
+        elapsed = time.perf_counter() - t0
+        print(f'draw_all reuse_buffer={reuse!s:<5}: {total / elapsed:6.1f} charts/sec')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+# several worker processes reading and booking against one sqlite file, with
+# the default rollback journal and with the pragmas from database.py.
+#   python -m benchmarks.bench_concurrency
+import multiprocessing
+import time
+from datetime import date, datetime, time as clock, timedelta
+
+from sqlalchemy.exc import OperationalError
+
+from benchmarks.common import make_app, drop_app
+from booking import reserve_slot, SlotUnavailable
+from database import SQLITE_PRAGMAS
+from models import db, User, DoctorAvailability
+from queries import NAME_ORDER
+from pagination import keyset_page
+from slots import free_slots
+
+WORKERS = 4
+DURATION = 5        # seconds per configuration
+WRITE_EVERY = 2     # one booking per this many operations (a booking spike)
+DOCTORS = 20
+
+
+def seed():
+    doctors = [User(email=f'doc{i}@bench', password='x', first_name='Doc', last_name=str(i), role='doctor')
+               for i in range(DOCTORS)]
+    patient = User(email='pat@bench', password='x', first_name='Bench', last_name='Patient', role='patient')
+    db.session.add_all(doctors + [patient])
+    db.session.flush()
+    start = date(2030, 1, 1)
+    db.session.add_all(
+        DoctorAvailability(doctor_id=d.id, available_date=start + timedelta(days=day),
+                           start_time=clock(8), end_time=clock(18))
+        for d in doctors for day in range(7)
+    )
+    db.session.commit()
+    return [d.id for d in doctors], patient.id
+
+
+def worker(uri, pragmas, worker_id, doctor_ids, patient_id, results):
+    from app import create_app
+    app = create_app({'SQLALCHEMY_DATABASE_URI': uri, 'SQLITE_PRAGMAS': pragmas, 'TESTING': True})
+    reads = writes = locked = 0
+    # each worker books its own minutes, so conflicts are lock contention only
+    when = datetime(2031, 1, 1) + timedelta(days=worker_id * 1000)
+    with app.app_context():
+        deadline = time.perf_counter() + DURATION
+        i = 0
+        while time.perf_counter() < deadline:
+            i += 1
+            try:
+                if i % WRITE_EVERY == 0:
+                    when += timedelta(minutes=1)
+                    reserve_slot(patient_id, doctor_ids[i % DOCTORS], when, retries=0)
+                    writes += 1
+                else:
+                    doctor_id = doctor_ids[i % DOCTORS]
+                    free_slots(doctor_id, date(2030, 1, 1), date(2030, 1, 7))
+                    keyset_page(User.query.filter_by(role='doctor'), NAME_ORDER, None, 20)
+                    reads += 1
+            except (OperationalError, SlotUnavailable):
+                db.session.rollback()
+                locked += 1
+        db.session.remove()
+    results.put((reads, writes, locked))
+
+
+def run(label, pragmas):
+    app = make_app({'SQLITE_PRAGMAS': pragmas})
+    try:
+        with app.app_context():
+            doctor_ids, patient_id = seed()
+            uri = app.config['SQLALCHEMY_DATABASE_URI']
+            db.engine.dispose()
+
+        results = multiprocessing.Queue()
+        processes = [multiprocessing.Process(target=worker, args=(uri, pragmas, i, doctor_ids, patient_id, results))
+                     for i in range(WORKERS)]
+        for p in processes:
+            p.start()
+        totals = [sum(t) for t in zip(*(results.get() for _ in processes))]
+        for p in processes:
+            p.join()
+
+        reads, writes, locked = totals
+        print(f'{label:<18} reads/sec={reads / DURATION:>8.0f}  writes/sec={writes / DURATION:>6.0f}  '
+              f'locked errors={locked}')
+    finally:
+        drop_app(app)
+
+
+def main():
+    run('rollback journal', {})
+    run('wal + pragmas', SQLITE_PRAGMAS)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+# checks that the planner picks the indexes from models.py for the hot queries
+#   python -m benchmarks.bench_explain
+from datetime import date, timedelta
+
+from sqlalchemy import text
+
+from benchmarks.common import make_app, drop_app
+from migrations import MIGRATIONS, run_migrations, schema_migrations
+from models import db, User, Appointment, DoctorAvailability
+
+# (description, query, index the plan must use)
+def hot_queries():
+    today = date.today()
+    return [
+        ('doctor dashboard', Appointment.query.filter(
+            Appointment.doctor_id == 1, Appointment.status == 'Booked',
+        ).order_by(Appointment.appointment_datetime), 'ix_appointments_doctor_status_datetime'),
+        ('patient dashboard', Appointment.query.filter(
+            Appointment.patient_id == 1, Appointment.status == 'Booked',
+        ).order_by(Appointment.appointment_datetime), 'ix_appointments_patient_status_datetime'),
+        ('admin appointments', Appointment.query.order_by(
+            Appointment.appointment_datetime.desc(), Appointment.id.desc()).limit(50),
+         'ix_appointments_datetime_id'),
+        ('doctor list', User.query.filter_by(role='doctor').order_by(User.first_name, User.id).limit(50),
+         'ix_users_role_first_name'),
+        ('availability', DoctorAvailability.query.filter(
+            DoctorAvailability.doctor_id == 1,
+            DoctorAvailability.available_date.between(today, today + timedelta(days=7)),
+        ), 'ix_availability_doctor_date'),
+    ]
+
+
+def explain(query):
+    statement = query.statement.compile(db.engine, compile_kwargs={'literal_binds': True})
+    rows = db.session.execute(text(f'EXPLAIN QUERY PLAN {statement}')).all()
+    return ' | '.join(row[-1] for row in rows)
+
+
+# turn the fresh database into a pre-index one, then let the migration runner fix it
+def strip_indexes():
+    with db.engine.begin() as conn:
+        for _, query, index in hot_queries():
+            conn.execute(text(f'DROP INDEX IF EXISTS {index}'))
+        conn.execute(schema_migrations.delete())
+    applied = run_migrations(db.engine)
+    assert applied == [version for version, _, _ in MIGRATIONS], applied
+
+
+def main():
+    app = make_app()
+    try:
+        with app.app_context():
+            # the plan format checked here is sqlite's EXPLAIN QUERY PLAN
+            if db.engine.dialect.name != 'sqlite':
+                print(f'skipped: EXPLAIN checks are sqlite only, not {db.engine.dialect.name}')
+                return
+            strip_indexes()
+            failed = 0
+            for name, query, index in hot_queries():
+                plan = explain(query)
+                ok = index in plan
+                failed += not ok
+                print(f"{'ok  ' if ok else 'FAIL'} {name:<20} {plan}")
+            assert not failed, f'{failed} queries do not use their index'
+    finally:
+        drop_app(app)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+# a patient hunting for the earliest slot in a department: the old way opens
+# find_doctors and then book_appointment for every doctor of the department;
+# the first-available page merges all their free slots in one pass, and
+# serves repeats from the per-department cache until a booking changes.
+#   python -m benchmarks.bench_first_available
+import time
+
+from benchmarks.common import make_app, drop_app, login, QueryCounter
+from benchmarks.datagen import generate
+from first_available import first_available
+from models import db, User, Department
+
+REPEAT = 20
+
+
+def measure(client, engine, urls, repeat):
+    with QueryCounter(engine) as counter:
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            for url in urls:
+                response = client.get(url)
+                assert response.status_code == 200, (url, response.status_code)
+        elapsed = time.perf_counter() - t0
+    return elapsed / repeat * 1000, counter.count / repeat
+
+
+def main():
+    app = make_app()
+    try:
+        with app.app_context():
+            data = generate(20000)
+            engine = db.engine
+            departments = [(d.id, d.name, [i for i, in db.session.query(User.id).filter_by(role='doctor', specialization_id=d.id)])
+                           for d in Department.query.order_by(Department.id)]
+        client = app.test_client()
+        login(client, data.patient_ids[0])
+        print(data)
+
+        for department_id, name, doctor_ids in departments[:4]:
+            hunt = [f'/patient/find_doctors?search={name}'] + [f'/patient/book_appointment/{i}' for i in doctor_ids]
+            hunt_ms, hunt_q = measure(client, engine, hunt, 3)
+            url = [f'/patient/first_available/{department_id}']
+            with app.app_context():
+                first_available.clear()
+            cold_ms, cold_q = measure(client, engine, url, 1)
+            warm_ms, warm_q = measure(client, engine, url, REPEAT)
+            print(f'{name:<18} {len(doctor_ids):>2} doctors   per-doctor pages {hunt_ms:6.1f} ms {hunt_q:4.0f} queries   '
+                  f'first available cold {cold_ms:5.1f} ms {cold_q:2.0f} queries, cached {warm_ms:5.1f} ms {warm_q:2.0f} queries')
+    finally:
+        drop_app(app)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+# repeat polls of read-mostly endpoints: a full GET against a revalidation
+# with the ETag from the previous response (304, one primary key lookup).
+#   python -m benchmarks.bench_http_cache
+import time
+
+from benchmarks.common import make_app, drop_app, login, QueryCounter
+from benchmarks.datagen import generate
+from models import db
+
+POLLS = 200
+
+
+def poll(client, engine, url, headers):
+    with QueryCounter(engine) as counter:
+        t0 = time.perf_counter()
+        for _ in range(POLLS):
+            response = client.get(url, headers=headers)
+        elapsed = time.perf_counter() - t0
+    return response, elapsed / POLLS * 1000, counter.count / POLLS
+
+
+def main():
+    app = make_app()
+    try:
+        with app.app_context():
+            data = generate(20000)
+            engine = db.engine
+        client = app.test_client()
+        login(client, data.admin_id)
+
+        for url in ('/api/doctors?limit=500', '/api/patients?limit=500', '/admin/view_doctors'):
+            full, full_ms, full_queries = poll(client, engine, url, {})
+            etag = full.headers['ETag']
+            cached, cached_ms, cached_queries = poll(client, engine, url, {'If-None-Match': etag})
+            assert cached.status_code == 304, cached.status_code
+            print(f'{url:<26} 200: {full_ms:6.2f} ms {len(full.data):>7} bytes {full_queries:.0f} queries   '
+                  f'304: {cached_ms:5.2f} ms {len(cached.data)} bytes {cached_queries:.0f} queries')
+    finally:
+        drop_app(app)
+
+
+if __name__ == '__main__':
+    main()
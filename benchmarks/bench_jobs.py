@@ -0,0 +1,45 @@
+# removing users with a long history: the admin request only queues the job,
+# the cascade (treatments, appointments, availability, then the user) runs
+# on the job workers - here job_queue.drain() - in batched transactions.
+#   python -m benchmarks.bench_jobs
+import time
+
+from benchmarks.common import make_app, drop_app, login, QueryCounter
+from benchmarks.datagen import generate
+from jobs import job_queue
+from models import db, Appointment
+
+USERS = 5
+
+
+def main():
+    app = make_app()
+    try:
+        with app.app_context():
+            data = generate(50000)
+            engine = db.engine
+            history = db.session.query(Appointment).filter(Appointment.doctor_id.in_(data.doctor_ids[:USERS])).count()
+        client = app.test_client()
+        login(client, data.admin_id)
+        print(f'{data}, removing {USERS} doctors with {history} appointments')
+
+        with QueryCounter(engine) as counter:
+            t0 = time.perf_counter()
+            for doctor_id in data.doctor_ids[:USERS]:
+                response = client.get(f'/admin/delete_doctor/{doctor_id}')
+                assert response.status_code == 302, response.status_code
+            request_ms = (time.perf_counter() - t0) / USERS * 1000
+        print(f'request (enqueue)  {request_ms:7.1f} ms  {counter.count / USERS:4.0f} queries per user')
+
+        with app.app_context(), QueryCounter(engine) as counter:
+            t0 = time.perf_counter()
+            ran = job_queue.drain()
+            job_ms = (time.perf_counter() - t0) / ran * 1000
+            assert all(job['status'] == 'done' for job in job_queue.summary()['jobs']), job_queue.summary()
+        print(f'job (cascade)      {job_ms:7.1f} ms  {counter.count / ran:4.0f} queries per user')
+    finally:
+        drop_app(app)
+
+
+if __name__ == '__main__':
+    main()
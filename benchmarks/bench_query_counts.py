@@ -0,0 +1,69 @@
+# list pages must issue the same number of queries whatever the row count
+#   python -m benchmarks.bench_query_counts
+from datetime import date, datetime, time, timedelta
+
+from benchmarks.common import make_app, drop_app, login, QueryCounter
+from models import db, User, Appointment, Treatment
+
+SIZES = (10, 100, 1000)
+
+
+def seed(rows):
+    admin = User(email='admin@bench', password='x', first_name='Bench', last_name='Admin', role='admin')
+    doctors = [User(email=f'doc{i}@bench', password='x', first_name=f'Doc{i}', last_name='Bench', role='doctor')
+               for i in range(5)]
+    patient = User(email='pat@bench', password='x', first_name='Pat', last_name='Bench', role='patient')
+    others = [User(email=f'pat{i}@bench', password='x', first_name=f'Pat{i}', last_name='Bench', role='patient')
+              for i in range(20)]
+    db.session.add_all([admin, patient] + doctors + others)
+    db.session.flush()
+
+    start = datetime.combine(date.today(), time(9))
+    patients = [patient] + others
+    for i in range(rows):
+        status = ('Booked', 'Completed', 'Cancelled')[i % 3]
+        appt = Appointment(doctor_id=doctors[i % len(doctors)].id, patient_id=patients[i % len(patients)].id,
+                           appointment_datetime=start + timedelta(minutes=30 * i), status=status)
+        db.session.add(appt)
+        if status == 'Completed':
+            appt.treatment = Treatment(diagnosis='checkup')
+    db.session.commit()
+    return {'admin': admin.id, 'doctor': doctors[0].id, 'patient': patient.id}
+
+
+def pages(ids):
+    return {
+        'admin.view_appointments': ('admin', '/admin/view_appointments'),
+        'doctor.dashboard': ('doctor', '/doctor/'),
+        'doctor.patient_history': ('doctor', f"/doctor/patient_history/{ids['patient']}"),
+        'patient.dashboard': ('patient', '/patient/'),
+    }
+
+
+def main():
+    counts = {}
+    for rows in SIZES:
+        app = make_app()
+        try:
+            with app.app_context():
+                ids = seed(rows)
+                engine = db.engine
+            client = app.test_client()
+            for page, (role, url) in pages(ids).items():
+                login(client, ids[role])
+                client.get(url)     # warm the session user cache
+                with QueryCounter(engine) as counter:
+                    response = client.get(url)
+                assert response.status_code == 200, (page, response.status_code)
+                counts.setdefault(page, []).append(counter.count)
+        finally:
+            drop_app(app)
+
+    print(f"{'page':<26}" + ''.join(f'{n:>8}' for n in SIZES))
+    for page, per_size in counts.items():
+        print(f'{page:<26}' + ''.join(f'{c:>8}' for c in per_size))
+        assert len(set(per_size)) == 1, f'{page} query count grows with rows: {per_size}'
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+# FTS5 search vs the ILIKE fallback over a large users table
+#   python -m benchmarks.bench_search [users]
+import random
+import sys
+import time
+
+import search
+from benchmarks.common import make_app, drop_app
+from models import db, User
+from search import search_users, PATIENT_FIELDS
+
+FIRST = ['Asha', 'Ravi', 'Maria', 'John', 'Chen', 'Fatima', 'Olga', 'Kwame', 'Lucia', 'Arjun', 'Emma', 'Noah']
+LAST = ['Sharma', 'Garcia', 'Smith', 'Wang', 'Khan', 'Ivanova', 'Mensah', 'Rossi', 'Patel', 'Brown']
+
+
+def seed(count):
+    rng = random.Random(42)
+    rows = [{
+        'email': f'user{i}@example.com', 'password': 'x', 'role': 'patient',
+        'first_name': rng.choice(FIRST) + str(i % 997), 'last_name': rng.choice(LAST),
+        'contact_number': f'9{rng.randrange(10**9):09d}',
+    } for i in range(count)]
+    db.session.execute(User.__table__.insert(), rows)
+    db.session.commit()
+
+
+def measure(queries, repeat=5):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for q in queries:
+            search_users(q, 'patient', PATIENT_FIELDS)
+            db.session.expunge_all()
+    return (time.perf_counter() - start) * 1000 / (repeat * len(queries))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    queries = ['asha', 'garc', 'maria ross', 'user123', '98765', 'kwame mens']
+    app = make_app()
+    try:
+        with app.app_context():
+            seed(count)
+            fts = measure(queries)
+            search._fts_engines[db.engine.url] = False
+            like = measure(queries)
+            search._fts_engines.clear()
+        print(f'{count} users: fts5 {fts:.2f} ms/query, ilike {like:.2f} ms/query')
+    finally:
+        drop_app(app)
+
+
+if __name__ == '__main__':
+    main()
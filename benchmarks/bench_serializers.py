@@ -0,0 +1,79 @@
+# cost per row of building an api list body: the old path loads Appointment
+# objects and dumps dicts with the json module; serializers reads plain column
+# tuples and encodes with orjson when it is installed. also a ?fields= subset
+# and a full /api/appointments page through the test client.
+#   python -m benchmarks.bench_serializers [appointments, default 100000]
+import json
+import sys
+import time
+
+import serializers
+from benchmarks.common import make_app, drop_app
+from benchmarks.datagen import generate
+from models import db, Appointment
+from serializers import APPOINTMENT
+
+REPEAT = 3
+
+
+def best(fn, repeat=REPEAT):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def orm_json():
+    rows = Appointment.query.order_by(Appointment.id).all()
+    body = json.dumps([{
+        "id": a.id,
+        "doctor_id": a.doctor_id,
+        "patient_id": a.patient_id,
+        "datetime": a.appointment_datetime.isoformat(),
+        "status": a.status
+    } for a in rows])
+    db.session.expunge_all()
+    return body
+
+
+def tuples(names, encoder):
+    def run():
+        columns = APPOINTMENT.columns(names)
+        rows = db.session.query(*columns).order_by(Appointment.id).all()
+        return encoder(APPOINTMENT.dicts(rows, names, columns))
+    return run
+
+
+def stdlib(data):
+    return json.dumps(data, default=serializers._default, separators=(',', ':')).encode('utf-8')
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    app = make_app()
+    try:
+        with app.app_context():
+            print(generate(count))
+            all_fields = APPOINTMENT.parse(None)
+            cases = [
+                ('orm objects + json', orm_json),
+                ('row tuples + json', tuples(all_fields, stdlib)),
+                ('row tuples + dumps', tuples(all_fields, serializers.dumps)),
+                ('?fields=id,datetime + dumps', tuples(APPOINTMENT.parse('id,datetime'), serializers.dumps)),
+            ]
+            print(f'encoder: {"orjson" if serializers.orjson else "json (orjson not installed)"}, {count} rows')
+            for label, fn in cases:
+                print(f'{label:<30} {best(fn) / count * 1e6:6.2f} us/row')
+
+        client = app.test_client()
+        for url in ('/api/appointments?limit=500', '/api/appointments?limit=500&fields=id,status'):
+            elapsed = best(lambda: client.get(url), 20)
+            print(f'{url:<45} {elapsed * 1000:6.2f} ms/page')
+    finally:
+        drop_app(app)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+# free-slot engine: query count must not grow with the availability window
+#   python -m benchmarks.bench_slots
+import time
+from datetime import date, datetime, time as dtime, timedelta
+
+from benchmarks.common import make_app, drop_app, QueryCounter
+from models import db, User, Appointment, DoctorAvailability
+from slots import free_slots
+
+
+def seed(days):
+    doctor = User(email='doc@bench', password='x', first_name='Bench', last_name='Doctor', role='doctor')
+    patient = User(email='pat@bench', password='x', first_name='Bench', last_name='Patient', role='patient')
+    db.session.add_all([doctor, patient])
+    db.session.flush()
+
+    today = date.today()
+    for offset in range(days):
+        day = today + timedelta(days=offset)
+        db.session.add(DoctorAvailability(doctor_id=doctor.id, available_date=day,
+                                          start_time=dtime(8, 0), end_time=dtime(20, 0)))
+        # book every third slot
+        for hour in range(8, 20, 3):
+            db.session.add(Appointment(doctor_id=doctor.id, patient_id=patient.id,
+                                       appointment_datetime=datetime.combine(day, dtime(hour, 0)),
+                                       status='Booked'))
+    db.session.commit()
+    return doctor.id
+
+
+def main():
+    print(f"{'days':>6} {'slots':>7} {'queries':>8} {'ms':>8}")
+    for days in (1, 7, 30, 90, 365):
+        app = make_app()
+        try:
+            with app.app_context():
+                doctor_id = seed(days)
+                start = date.today()
+                end = start + timedelta(days=days)
+
+                with QueryCounter(db.engine) as counter:
+                    t0 = time.perf_counter()
+                    slots = free_slots(doctor_id, start, end)
+                    elapsed = (time.perf_counter() - t0) * 1000
+
+                total = sum(len(s) for s in slots.values())
+                print(f'{days:>6} {total:>7} {counter.count:>8} {elapsed:>8.2f}')
+                assert counter.count == 2, 'slot engine must use a fixed number of queries'
+        finally:
+            drop_app(app)
+
+
+if __name__ == '__main__':
+    main()
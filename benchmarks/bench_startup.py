@@ -0,0 +1,59 @@
+# worker boot time: a fresh interpreter importing wsgi (which runs
+# create_app), then one more create_app() in the same process. "eager" imports
+# matplotlib up front the way the routes used to; "lazy" is the current tree.
+#   python -m benchmarks.bench_startup
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+RUNS = 5
+
+# prints: import seconds, create_app seconds, whether matplotlib got loaded
+SCRIPT = '''
+import sys, time
+t0 = time.perf_counter()
+{preload}
+import wsgi
+t1 = time.perf_counter()
+wsgi.create_app()
+t2 = time.perf_counter()
+print(t1 - t0, t2 - t1, 'matplotlib' in sys.modules)
+'''
+
+PRELOAD = {
+    'eager': 'import matplotlib.figure, matplotlib.backends.backend_agg',
+    'lazy': '',
+}
+
+
+def boot(preload, database_url):
+    env = dict(os.environ, DATABASE_URL=database_url)
+    out = subprocess.run([sys.executable, '-c', SCRIPT.format(preload=preload)], env=env,
+                         capture_output=True, text=True, check=True,
+                         cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    imported, created, loaded = out.stdout.split()
+    return float(imported), float(created), loaded == 'True'
+
+
+def main():
+    fd, path = tempfile.mkstemp(prefix='hms-bench-', suffix='.db')
+    os.close(fd)
+    try:
+        # first boot creates the schema, keep it out of the numbers
+        boot('', f'sqlite:///{path}')
+        for label, preload in PRELOAD.items():
+            runs = [boot(preload, f'sqlite:///{path}') for _ in range(RUNS)]
+            imported = statistics.median(r[0] for r in runs) * 1000
+            created = statistics.median(r[1] for r in runs) * 1000
+            print(f'{label:<6} import wsgi {imported:7.0f} ms   create_app() {created:6.0f} ms   '
+                  f'matplotlib loaded: {runs[0][2]}')
+    finally:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+if __name__ == '__main__':
+    main()
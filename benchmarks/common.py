@@ -0,0 +1,95 @@
+# shared helpers for the benchmark scripts - run them from the repo root, e.g.
+#   python -m benchmarks.bench_slots
+# by default each run gets a throwaway sqlite file. to run against another
+# backend set TEST_DATABASE_URL to a scratch database, e.g.
+#   TEST_DATABASE_URL=postgresql://localhost/hms_bench python -m benchmarks.bench_query_counts
+# every table in it is dropped before and after each run.
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import MetaData, create_engine, event, text
+
+from app import create_app
+from models import db
+from session_cache import session_users
+
+
+# drop everything in a scratch database, including tables created by migrations
+def _reset(engine):
+    with engine.begin() as conn:
+        if conn.dialect.name == 'sqlite':
+            # dropping the fts table also drops its shadow tables
+            conn.execute(text('DROP TABLE IF EXISTS user_search'))
+        metadata = MetaData()
+        metadata.reflect(conn)
+        metadata.drop_all(conn)
+
+
+# app bound to a throwaway database so benchmarks never touch instance/hospital.db
+def make_app(config=None):
+    url = os.environ.get('TEST_DATABASE_URL')
+    path = None
+    if url:
+        engine = create_engine(url)
+        _reset(engine)
+        engine.dispose()
+    else:
+        fd, path = tempfile.mkstemp(prefix='hms-bench-', suffix='.db')
+        os.close(fd)
+        url = f'sqlite:///{path}'
+
+    # no background job threads: they would poll the database behind the
+    # query counters; a benchmark runs its jobs with job_queue.drain()
+    settings = {'SQLALCHEMY_DATABASE_URI': url, 'TESTING': True, 'JOB_WORKERS': 0}
+    settings.update(config or {})
+    # cached users belong to whichever database ran before
+    session_users.clear()
+    app = create_app(settings)
+    app.bench_db_path = path
+    return app
+
+
+def drop_app(app):
+    with app.app_context():
+        db.session.remove()
+        if app.bench_db_path is None:
+            _reset(db.engine)
+        db.engine.dispose()
+    if app.bench_db_path and os.path.exists(app.bench_db_path):
+        os.remove(app.bench_db_path)
+    for suffix in ('-wal', '-shm'):
+        if app.bench_db_path and os.path.exists(app.bench_db_path + suffix):
+            os.remove(app.bench_db_path + suffix)
+
+
+# counts statements sent to the database while the block runs
+class QueryCounter:
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _count(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._count)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._count)
+
+
+@contextmanager
+def timed(label):
+    start = time.perf_counter()
+    yield
+    print(f'{label}: {(time.perf_counter() - start) * 1000:.2f} ms')
+
+
+# log a user into the test client without going through the bcrypt check
+def login(client, user_id):
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
@@ -0,0 +1,198 @@
+# seeded synthetic hospital data for load tests.
+# the scale is the number of appointments; patients, doctors and availability
+# are sized from it. the same scale and seed always give the same rows.
+# rows go in with executemany on an empty database and explicit ids, so a 1M
+# row run takes minutes rather than hours.
+#   python -m benchmarks.datagen --scale 100000 --database-url sqlite:////tmp/hms.db
+import random
+import time
+from datetime import date, datetime, timedelta, time as clock
+
+import bcrypt
+import click
+
+from models import db, User, Department, DoctorAvailability, Appointment, Treatment
+
+DEPARTMENTS = (
+    'Cardiology', 'Neurology', 'Orthopedics', 'Pediatrics', 'Dermatology', 'Oncology',
+    'Radiology', 'Psychiatry', 'Gastroenterology', 'Ophthalmology', 'Urology', 'General Medicine',
+)
+FIRST_NAMES = (
+    'Aarav', 'Maya', 'Liam', 'Olivia', 'Noah', 'Emma', 'Ravi', 'Sofia', 'Ethan', 'Priya', 'Lucas',
+    'Amelia', 'Mateo', 'Zara', 'Omar', 'Chloe', 'Kenji', 'Isla', 'Diego', 'Hana', 'Samuel', 'Leah',
+)
+LAST_NAMES = (
+    'Sharma', 'Smith', 'Garcia', 'Chen', 'Okafor', 'Müller', 'Rossi', 'Khan', 'Silva', 'Novak',
+    'Tanaka', 'Johnson', 'Patel', 'Brown', 'Kowalski', 'Haddad', 'Nguyen', 'Larsen', 'Costa', 'Ali',
+)
+REASONS = ('Checkup', 'Follow-up', 'Chest pain', 'Headache', 'Back pain', 'Rash', 'Fever', 'Vaccination')
+DIAGNOSES = ('Healthy', 'Hypertension', 'Migraine', 'Sprain', 'Eczema', 'Influenza', 'Anxiety')
+
+PASSWORD = 'password'
+DAY_START, DAY_END = 9, 17      # availability hours
+PAST_DAYS, FUTURE_DAYS = 365, 14
+CHUNK = 10000
+
+
+class Dataset:
+    def __init__(self, scale, seed):
+        self.scale = scale
+        self.seed = seed
+        self.admin_id = None
+        self.doctor_ids = []
+        self.patient_ids = []
+        self.department_names = []
+        self.rows = {}      # table -> rows inserted
+
+    def __repr__(self):
+        return f'Dataset(scale={self.scale}, ' + ', '.join(f'{t}={n}' for t, n in self.rows.items()) + ')'
+
+
+def sizes(scale):
+    return {
+        'doctors': max(10, scale // 500),
+        'patients': max(20, scale // 5),
+    }
+
+
+def _insert(table, rows, dataset):
+    for i in range(0, len(rows), CHUNK):
+        db.session.execute(table.insert(), rows[i:i + CHUNK])
+    dataset.rows[table.name] = dataset.rows.get(table.name, 0) + len(rows)
+
+
+# postgres sequences do not move when ids are given explicitly
+def _sync_sequences(tables):
+    if db.engine.dialect.name != 'postgresql':
+        return
+    for table in tables:
+        db.session.execute(db.text(
+            f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), (SELECT max(id) FROM {table.name}))"
+        ))
+
+
+def _person(rng, user_id, role, password, now):
+    first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+    return {
+        'id': user_id,
+        'email': f'{role}{user_id}@example.org',
+        'password': password,
+        'first_name': first,
+        'last_name': last,
+        'role': role,
+        'contact_number': f'+1555{rng.randrange(10 ** 7):07d}',
+        'gender': rng.choice(('Male', 'Female')),
+        'dob': date(1940, 1, 1) + timedelta(days=rng.randrange(365 * 65)),
+        'address': f'{rng.randrange(1, 999)} {last} Street',
+        'qualification': None,
+        'specialization_id': None,
+        'created_at': now,
+    }
+
+
+# fill an empty database; returns the ids scenarios need
+def generate(scale, seed=0):
+    if db.session.query(User.id).first() is not None:
+        raise click.ClickException('the database already has users, generate into an empty one')
+
+    rng = random.Random(seed)
+    dataset = Dataset(scale, seed)
+    now = datetime.now().replace(microsecond=0)
+    today = now.date()
+    # one hash for everyone: bcrypt at full cost would dominate the run
+    password = bcrypt.hashpw(PASSWORD.encode('utf-8'), bcrypt.gensalt(4)).decode('utf-8')
+    counts = sizes(scale)
+
+    departments = [{'id': i, 'name': name, 'description': f'{name} department'}
+                   for i, name in enumerate(DEPARTMENTS, start=1)]
+    _insert(Department.__table__, departments, dataset)
+    dataset.department_names = list(DEPARTMENTS)
+
+    admin = _person(rng, 1, 'admin', password, now)
+    admin['email'] = 'admin@example.org'
+    doctors, patients = [], []
+    next_id = 2
+    for _ in range(counts['doctors']):
+        doctor = _person(rng, next_id, 'doctor', password, now)
+        doctor['qualification'] = rng.choice(('MBBS', 'MD', 'MS', 'DNB'))
+        doctor['specialization_id'] = rng.choice(departments)['id']
+        doctors.append(doctor)
+        next_id += 1
+    for _ in range(counts['patients']):
+        patients.append(_person(rng, next_id, 'patient', password, now))
+        next_id += 1
+    _insert(User.__table__, [admin] + doctors + patients, dataset)
+    dataset.admin_id = 1
+    dataset.doctor_ids = [d['id'] for d in doctors]
+    dataset.patient_ids = [p['id'] for p in patients]
+
+    # every doctor works every weekday of the window
+    availability = [
+        {'doctor_id': doctor_id, 'available_date': day, 'start_time': clock(DAY_START), 'end_time': clock(DAY_END)}
+        for offset in range(-PAST_DAYS, FUTURE_DAYS + 1)
+        for day in [today + timedelta(days=offset)] if day.weekday() < 5
+        for doctor_id in dataset.doctor_ids
+    ]
+    _insert(DoctorAvailability.__table__, availability, dataset)
+
+    # weekday appointments on the half-hour grid, at most one booked per doctor and slot
+    slots_per_day = (DAY_END - DAY_START) * 2
+    appointments, treatments, booked = [], [], set()
+    appointment_id = 1
+    while appointment_id <= scale:
+        doctor_id = rng.choice(dataset.doctor_ids)
+        day = today + timedelta(days=rng.randrange(-PAST_DAYS, FUTURE_DAYS + 1))
+        if day.weekday() >= 5:
+            continue
+        when = datetime.combine(day, clock(DAY_START)) + timedelta(minutes=30 * rng.randrange(slots_per_day))
+        if when > now:
+            status = 'Booked' if rng.random() < 0.9 else 'Cancelled'
+        else:
+            status = 'Completed' if rng.random() < 0.8 else 'Cancelled'
+        if status == 'Booked':
+            if (doctor_id, when) in booked:
+                continue
+            booked.add((doctor_id, when))
+
+        appointments.append({
+            'id': appointment_id,
+            'patient_id': rng.choice(dataset.patient_ids),
+            'doctor_id': doctor_id,
+            'appointment_datetime': when,
+            'reason': rng.choice(REASONS),
+            'status': status,
+            'created_at': when - timedelta(days=rng.randrange(1, 30)),
+        })
+        if status == 'Completed':
+            treatments.append({
+                'appointment_id': appointment_id,
+                'diagnosis': rng.choice(DIAGNOSES),
+                'prescription': 'Rest and fluids',
+                'notes': None,
+                'created_at': when,
+            })
+        appointment_id += 1
+    _insert(Appointment.__table__, appointments, dataset)
+    _insert(Treatment.__table__, treatments, dataset)
+
+    _sync_sequences((User.__table__, Department.__table__, Appointment.__table__))
+    db.session.commit()
+    return dataset
+
+
+@click.command()
+@click.option('--scale', default=10000, show_default=True, help='Number of appointments.')
+@click.option('--seed', default=0, show_default=True)
+@click.option('--database-url', required=True, help='An empty database to fill.')
+def main(scale, seed, database_url):
+    """Fill an empty database with synthetic hospital data."""
+    from app import create_app
+    app = create_app({'SQLALCHEMY_DATABASE_URI': database_url})
+    with app.app_context():
+        start = time.perf_counter()
+        dataset = generate(scale, seed)
+        click.echo(f'{dataset} in {time.perf_counter() - start:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
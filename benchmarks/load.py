@@ -0,0 +1,193 @@
+# load test: scripted scenarios against the real routes on synthetic data.
+# each scenario logs in as a user picked from the dataset and runs a few
+# requests through the test client; an iteration's latency covers all of its
+# requests. results are compared with a saved baseline: a p95 more than
+# --tolerance slower, or any extra query per iteration, counts as a regression
+# and makes the run exit with status 1.
+#   python -m benchmarks.load --scale 10000
+#   python -m benchmarks.load --scale 100000 --scenario search --save-baseline
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+import click
+
+from benchmarks.common import make_app, drop_app, login, QueryCounter
+from benchmarks.datagen import generate, DAY_START, DAY_END, FIRST_NAMES, LAST_NAMES
+from models import db
+
+BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+
+def _next_weekday_slot(rng):
+    day = date.today() + timedelta(days=rng.randrange(1, 8))
+    while day.weekday() >= 5:
+        day += timedelta(days=1)
+    minutes = 30 * rng.randrange((DAY_END - DAY_START) * 2)
+    return datetime.combine(day, datetime.min.time()) + timedelta(hours=DAY_START, minutes=minutes)
+
+
+# scenario name -> (user to log in as, requests to run as (method, url, keyword arguments))
+def patient_booking(data, rng):
+    doctor_id = rng.choice(data.doctor_ids)
+    url = f'/patient/book_appointment/{doctor_id}'
+    form = {'appointment_datetime': _next_weekday_slot(rng).isoformat(), 'reason': 'Checkup'}
+    return rng.choice(data.patient_ids), [('GET', url, {}), ('POST', url, {'data': form})]
+
+
+def patient_dashboard(data, rng):
+    return rng.choice(data.patient_ids), [('GET', '/patient/', {})]
+
+
+def doctor_dashboard(data, rng):
+    return rng.choice(data.doctor_ids), [('GET', '/doctor/', {})]
+
+
+def admin_dashboard(data, rng):
+    return data.admin_id, [('GET', '/admin/', {})]
+
+
+def admin_lists(data, rng):
+    return data.admin_id, [
+        ('GET', '/admin/view_appointments', {}),
+        ('GET', '/admin/view_patients', {}),
+    ]
+
+
+def search(data, rng):
+    name = rng.choice(FIRST_NAMES + LAST_NAMES)[:rng.randrange(3, 6)]
+    return data.admin_id, [
+        ('GET', '/admin/search_patients', {'query_string': {'search': name}}),
+        ('GET', '/admin/search_doctors', {'query_string': {'search': name}}),
+    ]
+
+
+def find_doctors(data, rng):
+    return rng.choice(data.patient_ids), [
+        ('GET', '/patient/find_doctors', {'query_string': {'search': rng.choice(data.department_names)}}),
+    ]
+
+
+def first_available(data, rng):
+    department_id = rng.randrange(1, len(data.department_names) + 1)
+    return rng.choice(data.patient_ids), [('GET', f'/patient/first_available/{department_id}', {})]
+
+
+def rest_api(data, rng):
+    return data.admin_id, [
+        ('GET', '/api/doctors', {}),
+        ('GET', '/api/patients', {'query_string': {'limit': 100}}),
+        ('GET', '/api/appointments', {'query_string': {'limit': 100}}),
+    ]
+
+
+SCENARIOS = {
+    'patient_booking': patient_booking,
+    'patient_dashboard': patient_dashboard,
+    'doctor_dashboard': doctor_dashboard,
+    'admin_dashboard': admin_dashboard,
+    'admin_lists': admin_lists,
+    'search': search,
+    'find_doctors': find_doctors,
+    'first_available': first_available,
+    'rest_api': rest_api,
+}
+
+
+def run_scenario(client, engine, scenario, data, rng, iterations, warmup=3):
+    latencies, queries = [], []
+    for i in range(warmup + iterations):
+        user_id, requests = scenario(data, rng)
+        login(client, user_id)
+        with QueryCounter(engine) as counter:
+            start = time.perf_counter()
+            for method, url, kwargs in requests:
+                response = client.open(url, method=method, **kwargs)
+                if response.status_code >= 400:
+                    raise click.ClickException(f'{method} {url} returned {response.status_code}')
+            elapsed = time.perf_counter() - start
+        if i >= warmup:
+            latencies.append(elapsed)
+            queries.append(counter.count)
+
+    cuts = statistics.quantiles(latencies, n=100, method='inclusive')
+    return {
+        'p50': round(cuts[49] * 1000, 2),
+        'p95': round(cuts[94] * 1000, 2),
+        'p99': round(cuts[98] * 1000, 2),
+        'throughput': round(len(latencies) / sum(latencies), 1),
+        'queries': round(statistics.mean(queries), 2),
+    }
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    header = f"{'scenario':<18} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'iter/s':>8} {'queries':>8}"
+    click.echo(header + ('  vs baseline' if baseline else ''))
+    for name, r in results.items():
+        line = (f"{name:<18} {r['p50']:>8.1f} {r['p95']:>8.1f} {r['p99']:>8.1f} "
+                f"{r['throughput']:>8.1f} {r['queries']:>8.1f}")
+        base = (baseline or {}).get(name)
+        if base:
+            change = (r['p95'] - base['p95']) / base['p95'] if base['p95'] else 0.0
+            line += f"  p95 {change:+.0%}, queries {r['queries'] - base['queries']:+.1f}"
+            if change > tolerance:
+                regressions.append(f"{name}: p95 {base['p95']:.1f} -> {r['p95']:.1f} ms")
+            if r['queries'] > base['queries'] + 0.5:
+                regressions.append(f"{name}: queries {base['queries']:.1f} -> {r['queries']:.1f}")
+        click.echo(line)
+    return regressions
+
+
+@click.command()
+@click.option('--scale', default=10000, show_default=True, help='Appointments in the synthetic dataset.')
+@click.option('--seed', default=0, show_default=True)
+@click.option('--iterations', default=100, show_default=True, help='Timed iterations per scenario.')
+@click.option('--scenario', 'names', multiple=True, type=click.Choice(list(SCENARIOS)),
+              help='Run only these scenarios (repeatable).')
+@click.option('--baseline', 'baseline_path', default=BASELINE, show_default=True, type=click.Path(dir_okay=False))
+@click.option('--save-baseline', is_flag=True, help='Store these results as the new baseline.')
+@click.option('--tolerance', default=0.5, show_default=True, help='Allowed p95 slowdown against the baseline.')
+def main(scale, seed, iterations, names, baseline_path, save_baseline, tolerance):
+    """Drive the app's routes on synthetic data and report latency percentiles."""
+    app = make_app()
+    try:
+        with app.app_context():
+            start = time.perf_counter()
+            data = generate(scale, seed)
+            click.echo(f'{data} generated in {time.perf_counter() - start:.1f}s')
+            engine = db.engine
+
+        client = app.test_client()
+        rng = random.Random(seed)
+        results = {}
+        for name in names or SCENARIOS:
+            results[name] = run_scenario(client, engine, SCENARIOS[name], data, rng, iterations)
+    finally:
+        drop_app(app)
+
+    saved = {}
+    if os.path.exists(baseline_path):
+        with open(baseline_path) as f:
+            saved = json.load(f)
+    # baselines are kept per scale, numbers from different data sizes do not compare
+    key = str(scale)
+    regressions = compare(results, saved.get(key), tolerance)
+
+    if save_baseline:
+        saved[key] = {**saved.get(key, {}), **results}
+        with open(baseline_path, 'w') as f:
+            json.dump(saved, f, indent=2, sort_keys=True)
+            f.write('\n')
+        click.echo(f'baseline for scale {scale} saved to {baseline_path}')
+    elif regressions:
+        click.echo('regressions:\n  ' + '\n  '.join(regressions), err=True)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+# atomic slot reservation.
+# the partial unique index uq_appointments_booked_slot allows one 'Booked'
+# appointment per (doctor, time), so the INSERT itself is the availability
+# check: two workers racing for a slot cannot both commit. a violation of that
+# index means the slot is gone; any other constraint error is the caller's bug
+# and is raised as is. a locked/busy database is transient and retried.
+import random
+import time
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from models import db, Appointment
+
+
+SLOT_INDEX = 'uq_appointments_booked_slot'
+
+
+class SlotUnavailable(Exception):
+    pass
+
+
+# an IntegrityError from a second booking of a slot, not some other constraint
+def slot_taken(error):
+    diag = getattr(error.orig, 'diag', None)     # psycopg names the constraint
+    if diag is not None and getattr(diag, 'constraint_name', None):
+        return diag.constraint_name == SLOT_INDEX
+    # sqlite lists the index's columns
+    return 'UNIQUE constraint failed: appointments.doctor_id, appointments.appointment_datetime' in str(error.orig)
+
+
+def _transient(error):
+    message = str(error.orig).lower()
+    return any(word in message for word in ('locked', 'busy', 'could not serialize', 'deadlock'))
+
+
+def reserve_slot(patient_id, doctor_id, appointment_datetime, reason=None, retries=None):
+    retries = current_app.config.get('BOOKING_RETRIES', 5) if retries is None else retries
+
+    for attempt in range(retries + 1):
+        appointment = Appointment(
+            patient_id=patient_id,
+            doctor_id=doctor_id,
+            appointment_datetime=appointment_datetime,
+            reason=reason,
+            status='Booked',
+            created_at=datetime.utcnow()
+        )
+        db.session.add(appointment)
+        try:
+            db.session.commit()
+            return appointment
+        except IntegrityError as e:
+            db.session.rollback()
+            if slot_taken(e):
+                raise SlotUnavailable('That time slot is already booked.')
+            raise
+        except OperationalError as e:
+            db.session.rollback()
+            if not _transient(e) or attempt == retries:
+                raise
+            # back off with jitter so competing writers do not retry in lockstep
+            time.sleep(0.01 * 2 ** attempt * (1 + random.random()))
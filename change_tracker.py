@@ -0,0 +1,116 @@
+# per-table data versions, stored in the database so every worker process
+# sees the same numbers. a session notes which tracked tables it writes (ORM
+# flushes and insert/update/delete statements run through session.execute) and
+# bumps their rows in table_versions as the last statements of its transaction,
+# just before it commits: the new version is committed atomically with the
+# data, and a writer only holds the counter rows while it commits. writes made
+# on a bare connection or by another program call bump() themselves. caches
+# and ETags key on these, so any change makes old entries stale.
+from itertools import chain
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, event, func, select, text, update
+from sqlalchemy.orm import Session
+
+from models import db
+
+TRACKED_TABLES = ('departments', 'users', 'doctor_availability', 'appointments', 'treatments')
+
+_metadata = MetaData()
+table_versions = Table(
+    'table_versions', _metadata,
+    Column('table_name', String(64), primary_key=True),
+    Column('version', Integer, nullable=False, default=0),
+    Column('updated_at', DateTime, nullable=False),
+)
+
+# migration: the versions table, one row per tracked table
+def create_version_table(conn):
+    _metadata.create_all(conn)
+    existing = set(conn.execute(select(table_versions.c.table_name)).scalars())
+    now = conn.execute(select(func.current_timestamp())).scalar()
+    missing = [{'table_name': t, 'version': 0, 'updated_at': now} for t in TRACKED_TABLES if t not in existing]
+    if missing:
+        conn.execute(table_versions.insert(), missing)
+
+
+# migration: bumps used to come from row/statement triggers inside every
+# writing transaction, which serialised writers on the counter rows
+def drop_version_triggers(conn):
+    if conn.dialect.name == 'sqlite':
+        for table in TRACKED_TABLES:
+            for op in ('insert', 'update', 'delete'):
+                conn.execute(text(f'DROP TRIGGER IF EXISTS {table}_version_{op}'))
+    elif conn.dialect.name == 'postgresql':
+        for table in TRACKED_TABLES:
+            conn.execute(text(f'DROP TRIGGER IF EXISTS {table}_version ON {table}'))
+        conn.execute(text('DROP FUNCTION IF EXISTS bump_table_version()'))
+
+
+# {table: (version, updated_at)} in one query
+def versions(*tables):
+    rows = db.session.execute(
+        select(table_versions.c.table_name, table_versions.c.version, table_versions.c.updated_at)
+        .where(table_versions.c.table_name.in_(tables))
+    )
+    found = {name: (number, updated_at) for name, number, updated_at in rows}
+    return {table: found.get(table, (0, None)) for table in tables}
+
+
+def version(*tables):
+    state = versions(*tables)
+    return tuple(state[table][0] for table in tables)
+
+
+# one table at a time in name order, so concurrent bumps never wait on each other in a cycle
+def _bump(conn, tables):
+    for table in sorted(tables):
+        conn.execute(
+            update(table_versions)
+            .where(table_versions.c.table_name == table)
+            .values(version=table_versions.c.version + 1, updated_at=func.current_timestamp())
+        )
+
+
+# record a write the session did not see
+def bump(*tables):
+    with db.engine.begin() as conn:
+        _bump(conn, tables)
+
+
+def _note(session, tables):
+    tables = {table for table in tables if table in TRACKED_TABLES}
+    if tables:
+        session.info.setdefault('changed_tables', set()).update(tables)
+
+
+@event.listens_for(Session, 'after_flush')
+def _track_flush(session, flush_context):
+    _note(session, (
+        obj.__table__.name
+        for obj in chain(session.new, session.dirty, session.deleted)
+        if hasattr(obj, '__table__')
+    ))
+
+
+# session.execute(insert/update/delete), including query(...).update() and .delete()
+@event.listens_for(Session, 'do_orm_execute')
+def _track_execute(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = getattr(orm_execute_state.statement, 'table', None)
+        if table is not None:
+            _note(orm_execute_state.session, [table.name])
+
+
+# on the session's own connection, so the bump commits (or rolls back) with the writes
+@event.listens_for(Session, 'before_commit')
+def _bump_committing(session):
+    # commit flushes after this hook; flush now so those writes are noted too
+    session.flush()
+    tables = session.info.pop('changed_tables', None)
+    if tables:
+        _bump(session.connection(), tables)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_rolled_back(session):
+    session.info.pop('changed_tables', None)
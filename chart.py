@@ -1,15 +1,75 @@
-# helpers/chart_utils.py
-import matplotlib
-matplotlib.use('Agg')  # for headless servers
-import matplotlib.pyplot as plt
-from io import BytesIO
+# server-side chart rendering (CHART_RENDERER = 'server').
+# every chart gets its own Figure and Agg canvas instead of going through the
+# global pyplot state machine, so charts can be drawn from any number of
+# threads at once without picking up each other's axes.
+# matplotlib is imported on the first draw, not with this module: it is about
+# half of the app's import time and most processes never render a chart.
 import base64
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+_local = threading.local()
+_executor = None
+_executor_lock = threading.Lock()
+
 
-def plot_to_img():
-    buffer = BytesIO()
-    plt.savefig(buffer, format='png', bbox_inches='tight')
+def _buffer(reuse):
+    if not reuse:
+        return BytesIO()
+    # one scratch buffer per thread, rewound instead of reallocated
+    buffer = getattr(_local, 'buffer', None)
+    if buffer is None:
+        buffer = _local.buffer = BytesIO()
     buffer.seek(0)
-    image_png = buffer.getvalue()
-    buffer.close()
-    plt.close()
-    return base64.b64encode(image_png).decode('utf-8')
+    buffer.truncate()
+    return buffer
+
+
+def figure_to_img(fig, reuse_buffer=False):
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    FigureCanvasAgg(fig)
+    buffer = _buffer(reuse_buffer)
+    fig.savefig(buffer, format='png', bbox_inches='tight')
+    return base64.b64encode(buffer.getbuffer()).decode('utf-8')
+
+
+# a chart from chart_data, as a base64 png
+def draw(spec, reuse_buffer=False):
+    from matplotlib.figure import Figure
+    labels, values = spec['labels'], spec['values']
+
+    if spec['type'] == 'pie':
+        fig = Figure(figsize=(4, 4))
+        ax = fig.subplots()
+        if sum(values) > 0:
+            ax.pie(values, labels=labels, autopct='%1.1f%%', startangle=90)
+        else:
+            # no data yet, draw a neutral placeholder
+            ax.pie([1], labels=['No data'], colors=['#dddddd'])
+    else:
+        x = list(range(len(labels)))
+        fig = Figure(figsize=(5, 3))
+        ax = fig.subplots()
+        ax.bar(x, values, color=spec.get('color'), edgecolor=spec.get('edgecolor'))
+        ax.set_xticks(x, labels, rotation=spec.get('tick_rotation', 0))
+        if spec.get('xlabel'):
+            ax.set_xlabel(spec['xlabel'])
+        if spec.get('ylabel'):
+            ax.set_ylabel(spec['ylabel'])
+
+    ax.set_title(spec['title'])
+    return figure_to_img(fig, reuse_buffer)
+
+
+def _pool(workers):
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='chart-render')
+        return _executor
+
+
+# several charts at once on a shared thread pool; images come back in order
+def draw_all(specs, workers=4, reuse_buffer=True):
+    return list(_pool(workers).map(lambda spec: draw(spec, reuse_buffer), specs))
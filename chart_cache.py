@@ -0,0 +1,85 @@
+# cache for rendered dashboard charts.
+# entries are keyed on (chart name, data version) and expire after a TTL; the
+# least recently used ones are evicted once the cache is full. a stale or missing
+# chart is rendered on a background worker while the page gets the last good image.
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import change_tracker
+
+log = logging.getLogger(__name__)
+
+
+class ChartCache:
+    def __init__(self, max_entries=32, ttl=300, workers=4):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.workers = workers
+        self._entries = OrderedDict()   # (name, version) -> (image, rendered_at)
+        self._latest = {}               # name -> last good image, whatever its version
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def init_app(self, app):
+        self.max_entries = app.config.setdefault('CHART_CACHE_SIZE', self.max_entries)
+        self.ttl = app.config.setdefault('CHART_CACHE_TTL', self.ttl)
+        self.workers = app.config.setdefault('CHART_WORKERS', self.workers)
+
+    def _pool(self):
+        if self._executor is None:
+            # draw functions must not share state (chart.draw uses one Figure per chart)
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='chart')
+        return self._executor
+
+    # image for a chart, or None if it has never been rendered.
+    # loader() runs in the request (database work); draw(data) returns a base64 png
+    # and always runs on the worker pool.
+    def get(self, name, tables, loader, draw):
+        key = (name, change_tracker.version(*tables))
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and time.monotonic() - entry[1] < self.ttl:
+                self._entries.move_to_end(key)
+                return entry[0]
+            latest = self._latest.get(name)
+            if key in self._pending:
+                return latest
+            self._pending.add(key)
+
+        try:
+            data = loader()
+            self._pool().submit(self._render, key, draw, data)
+        except Exception:
+            with self._lock:
+                self._pending.discard(key)
+            raise
+        return latest
+
+    def _render(self, key, draw, data):
+        try:
+            image = draw(data)
+        except Exception:
+            log.exception('rendering chart %s failed', key[0])
+            image = None
+        with self._lock:
+            self._pending.discard(key)
+            if image is None:
+                return
+            self._entries[key] = (image, time.monotonic())
+            self._entries.move_to_end(key)
+            self._latest[key[0]] = image
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._latest.clear()
+
+
+chart_cache = ChartCache()
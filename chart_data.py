@@ -0,0 +1,50 @@
+# dashboard charts as data.
+# a chart is a small json-able dict - the aggregated series plus how to show
+# it - so the browser can draw it with plotly (CHART_RENDERER = 'client') or
+# chart.draw can render it to a png on the server (CHART_RENDERER = 'server').
+import stats
+
+STATUSES = ('Booked', 'Completed', 'Cancelled')
+
+
+def chart(kind, title, rows, **options):
+    return {
+        'type': kind,       # 'pie' or 'bar'
+        'title': title,
+        'labels': [label for label, _ in rows],
+        'values': [count for _, count in rows],
+        **options,          # xlabel, ylabel, color, edgecolor, tick_rotation
+    }
+
+
+def appointment_status():
+    return chart('pie', 'Appointment Status Distribution', stats.status_counts())
+
+
+def patient_age():
+    return chart('bar', 'Patient Age Distribution', stats.age_buckets(),
+                 xlabel='Age', ylabel='Count', color='skyblue', edgecolor='black')
+
+
+def doctor_specialization():
+    return chart('bar', 'Doctors per Specialization', stats.doctors_per_department(),
+                 color='lightgreen', tick_rotation=30)
+
+
+def weekly_load(doctor_id):
+    return chart('bar', 'Weekly Appointment Load', stats.weekday_histogram(doctor_id),
+                 xlabel='Day', ylabel='Appointments', color='orange')
+
+
+# every status shown, even at zero, so the pie keeps its colours from one visit to the next
+def patient_status(patient_id):
+    counts = dict(stats.status_counts(patient_id=patient_id))
+    return chart('pie', 'My Appointments', [(status, counts.get(status, 0)) for status in STATUSES])
+
+
+# admin dashboard: name -> (loader, tables it reads)
+ADMIN_CHARTS = {
+    'appointment_status': (appointment_status, ('appointments',)),
+    'patient_age': (patient_age, ('users',)),
+    'doctor_specialization': (doctor_specialization, ('users', 'departments')),
+}
@@ -0,0 +1,106 @@
+# streaming export of appointments with patient, doctor and treatment details.
+# rows are fetched from the database in batches (yield_per) and written out as
+# they arrive, so memory stays flat and the first bytes go out immediately.
+import csv
+import io
+import json
+from datetime import date, datetime
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import select
+from sqlalchemy.orm import aliased
+
+from models import db, User, Appointment, Treatment
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def appointment_export_query():
+    patient = aliased(User)
+    doctor = aliased(User)
+    return (
+        select(
+            Appointment.id.label('appointment_id'),
+            Appointment.appointment_datetime,
+            Appointment.status,
+            Appointment.reason,
+            Appointment.created_at,
+            patient.id.label('patient_id'),
+            patient.first_name.label('patient_first_name'),
+            patient.last_name.label('patient_last_name'),
+            patient.email.label('patient_email'),
+            doctor.id.label('doctor_id'),
+            doctor.first_name.label('doctor_first_name'),
+            doctor.last_name.label('doctor_last_name'),
+            Treatment.diagnosis,
+            Treatment.prescription,
+            Treatment.notes,
+            Treatment.created_at.label('treated_at'),
+        )
+        .select_from(Appointment)
+        .join(patient, Appointment.patient_id == patient.id)
+        .join(doctor, Appointment.doctor_id == doctor.id)
+        .outerjoin(Treatment, Treatment.appointment_id == Appointment.id)
+        .order_by(Appointment.id)
+    )
+
+
+# batches of result rows, streamed from the database cursor
+def appointment_batches(batch_size=1000):
+    query = appointment_export_query().execution_options(yield_per=batch_size)
+    result = db.session.execute(query)
+    yield result.keys()
+    for batch in result.partitions():
+        yield batch
+
+
+def _value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def csv_chunks(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    writer.writerow(next(batches))
+    for batch in batches:
+        writer.writerows([[_value(v) for v in row] for row in batch])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def ndjson_chunks(batches):
+    keys = list(next(batches))
+    for batch in batches:
+        yield ''.join(
+            json.dumps(dict(zip(keys, (_value(v) for v in row))), separators=(',', ':')) + '\n'
+            for row in batch
+        )
+
+
+def export_chunks(fmt, batch_size=1000):
+    batches = appointment_batches(batch_size)
+    if fmt == 'csv':
+        return csv_chunks(batches)
+    return ndjson_chunks(batches)
+
+
+@click.command('export-appointments')
+@click.option('--format', 'fmt', type=click.Choice(list(FORMATS)), default='csv', show_default=True)
+@click.option('--output', '-o', type=click.File('w', encoding='utf-8'), default='-',
+              help='File to write, stdout by default.')
+@click.option('--batch-size', default=1000, show_default=True)
+@with_appcontext
+def export_appointments_command(fmt, output, batch_size):
+    """Export every appointment with patient, doctor and treatment details."""
+    for chunk in export_chunks(fmt, batch_size):
+        output.write(chunk)
+    output.flush()
@@ -0,0 +1,101 @@
+# "first available doctor" for a department: its earliest free slots across all
+# of its doctors. each doctor's free slots are a lazy, time-ordered stream
+# (availability windows minus bookings, see slots.iter_free_slots) and
+# heapq.merge pulls from all of them at once, so the work stops after N slots
+# instead of expanding every doctor's calendar. a miss costs two queries
+# (windows with the doctors joined in, then bookings). results are cached per
+# department and keyed on the versions of the tables they read, so a booking,
+# cancellation or availability change is picked up on the next request.
+import heapq
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from datetime import datetime, timedelta
+from itertools import islice
+
+import change_tracker
+from models import db, User, DoctorAvailability
+from slots import slot_length, booked_times_for, iter_free_slots
+
+TABLES = ('users', 'doctor_availability', 'appointments')
+
+
+def _stream(doctor_id, windows, booked, minutes, after):
+    for slot in iter_free_slots(windows, booked, minutes, after):
+        yield slot, doctor_id
+
+
+# [(slot, doctor_id, doctor name)] - the first `count` free slots from `after` on,
+# looking at most `days` ahead
+def earliest_slots(department_id, count, after, days, minutes=None):
+    minutes = minutes or slot_length()
+    last_day = after.date() + timedelta(days=days)
+
+    windows, names = defaultdict(list), {}
+    rows = db.session.query(
+        DoctorAvailability.doctor_id, User.first_name, User.last_name,
+        DoctorAvailability.available_date, DoctorAvailability.start_time, DoctorAvailability.end_time,
+    ).join(User, User.id == DoctorAvailability.doctor_id).filter(
+        User.role == 'doctor',
+        User.specialization_id == department_id,
+        DoctorAvailability.available_date.between(after.date(), last_day),
+    )
+    for doctor_id, first_name, last_name, day, start, end in rows:
+        windows[doctor_id].append((day, start, end))
+        names[doctor_id] = f'{first_name} {last_name}'
+    if not windows:
+        return []
+
+    booked = booked_times_for(list(windows), after, datetime.combine(last_day + timedelta(days=1), datetime.min.time()))
+    streams = [_stream(doctor_id, doctor_windows, booked.get(doctor_id, []), minutes, after)
+               for doctor_id, doctor_windows in windows.items()]
+    return [(slot, doctor_id, names[doctor_id]) for slot, doctor_id in islice(heapq.merge(*streams), count)]
+
+
+class FirstAvailable:
+    def __init__(self, days=14, max_count=20, max_entries=64, ttl=300):
+        self.days = days
+        self.max_count = max_count
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()   # (department_id, version) -> (slots, exhausted, computed_at)
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.days = app.config.setdefault('FIRST_AVAILABLE_DAYS', self.days)
+        self.max_count = app.config.setdefault('FIRST_AVAILABLE_MAX', self.max_count)
+        self.max_entries = app.config.setdefault('FIRST_AVAILABLE_CACHE_SIZE', self.max_entries)
+        self.ttl = app.config.setdefault('FIRST_AVAILABLE_CACHE_TTL', self.ttl)
+
+    # the next `count` free slots in a department, clamped to 1..max_count.
+    # an entry always holds max_count slots; slots that have since started are
+    # skipped, and it is recomputed once too few are left
+    def get(self, department_id, count=None):
+        count = max(1, min(count or self.max_count, self.max_count))
+        now = datetime.now()
+        key = (department_id, change_tracker.version(*TABLES))
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and time.monotonic() - entry[2] < self.ttl:
+                self._entries.move_to_end(key)
+                slots, exhausted, _ = entry
+                upcoming = [s for s in slots if s[0] >= now]
+                if len(upcoming) >= count or exhausted:
+                    return upcoming[:count]
+
+        slots = earliest_slots(department_id, self.max_count, now, self.days)
+        with self._lock:
+            # fewer than asked for: there are no more within the horizon
+            self._entries[key] = (slots, len(slots) < self.max_count, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return slots[:count]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+first_available = FirstAvailable()
@@ -0,0 +1,72 @@
+# conditional GETs for read-mostly views.
+# the ETag of a response comes from the change counters of the tables it reads
+# (change_tracker), so checking whether a client's copy is current costs one
+# primary key lookup: a matching If-None-Match gets a 304 without running the
+# view at all. there is no Last-Modified: the counters' timestamps only have
+# whole seconds, and a second write within the same second would be answered
+# 304 to If-Modified-Since.
+import hashlib
+from functools import wraps
+
+from flask import current_app, make_response, request
+from flask_login import current_user
+
+import change_tracker
+
+
+def _etag(tables, per_user):
+    state = change_tracker.versions(*tables)
+    key = [request.endpoint, request.full_path, [state[t][0] for t in tables]]
+    if per_user:
+        # pages embed the user's own nav and name
+        key.append(current_user.get_id() if current_user.is_authenticated else None)
+    return hashlib.sha1(repr(key).encode('utf-8')).hexdigest()[:20]
+
+
+def _not_modified(etag):
+    return bool(request.if_none_match) and request.if_none_match.contains_weak(etag)
+
+
+def _headers(etag, cache_control, per_user):
+    headers = {'ETag': f'W/"{etag}"', 'Cache-Control': cache_control}
+    if per_user:
+        headers['Vary'] = 'Cookie'
+    return headers
+
+
+def _apply(response, headers):
+    for name, value in headers.items():
+        if name == 'Vary':
+            response.vary.add(value)
+        else:
+            response.headers[name] = value
+    return response
+
+
+# tables: what the view reads. cache_control: the header for this endpoint.
+# per_user: the body differs per logged-in user (html pages).
+# works on plain views and on flask-restful methods returning (data, status, headers)
+def conditional(*tables, cache_control='no-cache', per_user=False):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or not current_app.config.get('HTTP_CACHE_ENABLED', True):
+                return view(*args, **kwargs)
+
+            etag = _etag(tables, per_user)
+            headers = _headers(etag, cache_control, per_user)
+            if _not_modified(etag):
+                return _apply(current_app.response_class(status=304), headers)
+
+            result = view(*args, **kwargs)
+            if isinstance(result, tuple) and len(result) == 3 and not hasattr(result[0], 'status_code'):
+                # flask-restful: hand the headers back, its representation builds the response
+                data, status, extra = result
+                return (data, status, {**(extra or {}), **headers}) if status == 200 else result
+
+            response = make_response(result)
+            if response.status_code == 200:
+                _apply(response, headers)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,375 @@
+# bulk import of patients, doctors and doctor availability from csv or json.
+# input is read as a stream and handled in batches: each batch is validated,
+# its passwords are hashed on a process pool, and its rows are inserted with
+# one executemany in one transaction. bad rows are reported and skipped, and a
+# batch that still fails on insert is retried row by row, so one bad row never
+# costs the rest of the file.
+import csv
+import io
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from functools import partial
+from itertools import islice
+
+import bcrypt
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy.exc import IntegrityError
+
+import change_tracker
+from availability import normalise
+from models import db, User, Department, DoctorAvailability
+
+KINDS = ('patients', 'doctors', 'availability')
+
+
+class ImportFileError(Exception):
+    pass
+
+
+class ImportReport:
+    def __init__(self, kind):
+        self.kind = kind
+        self.inserted = 0
+        self.merged = 0     # availability rows folded into an overlapping window
+        self.errors = []    # (row number, message)
+        self.elapsed = 0.0
+
+    @property
+    def processed(self):
+        return self.inserted + len(self.errors)
+
+    @property
+    def rows_per_sec(self):
+        return self.processed / self.elapsed if self.elapsed else 0.0
+
+    def error(self, row_number, message):
+        self.errors.append((row_number, message))
+
+    def summary(self):
+        merged = f', {self.merged} merged into overlapping windows' if self.merged else ''
+        return (f'{self.kind}: {self.inserted} inserted{merged}, {len(self.errors)} rejected '
+                f'in {self.elapsed:.2f}s ({self.rows_per_sec:.0f} rows/sec)')
+
+
+# ---------------------------- reading -----------------------------------------
+
+# a line or element that could not be parsed; reported as that row's error
+class _Unreadable:
+    def __init__(self, message):
+        self.message = message
+
+
+# dicts from csv, ndjson/jsonl (one object per line) or a json array, one at a
+# time. a malformed ndjson line is reported and skipped; a malformed json
+# element or undecodable text ends the file, as nothing after it can be read
+def read_records(stream, filename):
+    ext = os.path.splitext(filename)[1].lower()
+    if ext == '.csv':
+        return _readable(csv.DictReader(stream))
+    if ext in ('.ndjson', '.jsonl'):
+        return _readable(_ndjson(stream))
+    if ext == '.json':
+        return _readable(_json_items(stream))
+    raise ImportFileError(f'Unsupported file type {ext!r}, use .csv, .json or .ndjson')
+
+
+def _readable(records):
+    records = iter(records)
+    while True:
+        try:
+            record = next(records)
+        except StopIteration:
+            return
+        except (csv.Error, UnicodeDecodeError) as e:
+            yield _Unreadable(f'could not read the rest of the file: {e}')
+            return
+        yield record
+
+
+def _ndjson(stream):
+    for line in stream:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            yield _Unreadable(f'invalid json: {e}')
+
+
+# the elements of a json array (or one object), decoded as the file is read
+def _json_items(stream, chunk_size=1 << 16, max_item=1 << 20):
+    decoder = json.JSONDecoder()
+    buffer, eof = '', False
+    in_array, need_comma = None, False
+    while True:
+        buffer = buffer.lstrip()
+        if not eof and len(buffer) < chunk_size:
+            data = stream.read(chunk_size)
+            buffer, eof = buffer + data, not data
+            continue
+        if in_array is None:
+            if not buffer:
+                return
+            in_array = buffer[0] == '['
+            buffer = buffer[1:] if in_array else buffer
+            continue
+        if in_array and buffer[:1] == ']':
+            return
+        if need_comma:
+            if buffer[:1] != ',':
+                yield _Unreadable("invalid json: expected ',' or ']' after an element")
+                return
+            buffer, need_comma = buffer[1:], False
+            continue
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except ValueError as e:
+            item, end = e, None
+        # the element may be cut off at the end of the buffer: read on and retry
+        if (end is None or end == len(buffer)) and not eof and len(buffer) < max_item:
+            data = stream.read(chunk_size)
+            buffer, eof = buffer + data, not data
+            continue
+        if end is None:
+            yield _Unreadable(f'invalid json: {item.msg}')
+            return
+        yield item
+        if not in_array:
+            return
+        buffer, need_comma = buffer[end:], True
+
+
+def _batches(iterable, size):
+    it = iter(iterable)
+    while True:
+        batch = list(islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+
+# ---------------------------- validation --------------------------------------
+
+def _check_record(record):
+    if isinstance(record, _Unreadable):
+        raise ValueError(record.message)
+    if not isinstance(record, dict):
+        raise ValueError('row is not an object')
+
+
+def _text(record, field, required=False):
+    value = record.get(field)
+    value = str(value).strip() if value is not None else ''
+    if required and not value:
+        raise ValueError(f'{field} is required')
+    return value or None
+
+
+def _parse(value, fmt, field):
+    try:
+        return datetime.strptime(value, fmt)
+    except ValueError:
+        raise ValueError(f'{field} {value!r} does not match {fmt}')
+
+
+def _user_values(record, role):
+    _check_record(record)
+    values = {
+        'email': _text(record, 'email', required=True),
+        'password': _text(record, 'password', required=True),
+        'first_name': _text(record, 'first_name', required=True),
+        'last_name': _text(record, 'last_name', required=True),
+        'role': role,
+        'contact_number': _text(record, 'contact_number'),
+        'gender': _text(record, 'gender'),
+        'address': _text(record, 'address'),
+    }
+    dob = _text(record, 'dob')
+    values['dob'] = _parse(dob, '%Y-%m-%d', 'dob').date() if dob else None
+    if role == 'doctor':
+        values['qualification'] = _text(record, 'qualification')
+    return values
+
+
+def _availability_values(record):
+    _check_record(record)
+    start = _parse(_text(record, 'start_time', required=True), '%H:%M', 'start_time').time()
+    end = _parse(_text(record, 'end_time', required=True), '%H:%M', 'end_time').time()
+    if start >= end:
+        raise ValueError('start_time must be before end_time')
+    return {
+        'doctor_email': _text(record, 'doctor_email', required=True),
+        'available_date': _parse(_text(record, 'available_date', required=True),
+                                 '%Y-%m-%d', 'available_date').date(),
+        'start_time': start,
+        'end_time': end,
+    }
+
+
+# ---------------------------- hashing -----------------------------------------
+
+def hash_password(password, rounds):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _hash_all(passwords, pool, rounds):
+    if pool is None:
+        return [hash_password(p, rounds) for p in passwords]
+    return list(pool.map(partial(hash_password, rounds=rounds), passwords, chunksize=8))
+
+
+# ---------------------------- inserting ---------------------------------------
+
+# executemany for the whole batch; on a constraint error fall back to one row at a time
+def _insert(table, rows, report):
+    try:
+        db.session.execute(table.insert(), [values for _, values in rows])
+        db.session.commit()
+        report.inserted += len(rows)
+        return
+    except IntegrityError:
+        db.session.rollback()
+
+    for row_number, values in rows:
+        try:
+            db.session.execute(table.insert(), [values])
+            db.session.commit()
+            report.inserted += 1
+        except IntegrityError as e:
+            db.session.rollback()
+            report.error(row_number, f'rejected by database: {e.orig}')
+
+
+def _import_users(batch, role, report, seen, pool, rounds, departments):
+    rows = []
+    for row_number, record in batch:
+        try:
+            values = _user_values(record, role)
+            if role == 'doctor':
+                values['specialization_id'] = _department_id(record, departments)
+        except ValueError as e:
+            report.error(row_number, str(e))
+            continue
+        if values['email'] in seen:
+            report.error(row_number, f"duplicate email {values['email']} in file")
+            continue
+        seen.add(values['email'])
+        rows.append((row_number, values))
+
+    # one query for every email in the batch that is already registered
+    emails = [values['email'] for _, values in rows]
+    existing = {e for e, in db.session.query(User.email).filter(User.email.in_(emails))} if emails else set()
+    for row_number, values in [r for r in rows if r[1]['email'] in existing]:
+        report.error(row_number, f"a user with email {values['email']} already exists")
+    rows = [r for r in rows if r[1]['email'] not in existing]
+    if not rows:
+        return
+
+    hashes = _hash_all([values['password'] for _, values in rows], pool, rounds)
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    for (_, values), hashed in zip(rows, hashes):
+        values['password'] = hashed
+        values['created_at'] = now
+    _insert(User.__table__, rows, report)
+
+
+def _department_id(record, departments):
+    name = _text(record, 'specialization')
+    if not name:
+        return None
+    if name.lower() not in departments:
+        raise ValueError(f'unknown specialization {name!r}')
+    return departments[name.lower()]
+
+
+def _import_availability(batch, report, touched):
+    rows = []
+    for row_number, record in batch:
+        try:
+            rows.append((row_number, _availability_values(record)))
+        except ValueError as e:
+            report.error(row_number, str(e))
+
+    emails = {values['doctor_email'] for _, values in rows}
+    doctors = dict(
+        db.session.query(User.email, User.id).filter(User.role == 'doctor', User.email.in_(emails))
+    ) if emails else {}
+
+    valid = []
+    for row_number, values in rows:
+        doctor_id = doctors.get(values.pop('doctor_email'))
+        if doctor_id is None:
+            report.error(row_number, 'no doctor with that doctor_email')
+            continue
+        values['doctor_id'] = doctor_id
+        valid.append((row_number, values))
+    if valid:
+        _insert(DoctorAvailability.__table__, valid, report)
+        touched.update(values['doctor_id'] for _, values in valid)
+
+
+# import an iterable of dicts; row numbers in the report count from 1
+def import_records(kind, records, batch_size=500, workers=None):
+    if kind not in KINDS:
+        raise ImportFileError(f'Unknown import kind {kind!r}')
+
+    report = ImportReport(kind)
+    rounds = current_app.config.get('BCRYPT_LOG_ROUNDS', 12)
+    workers = workers if workers is not None else current_app.config.get('IMPORT_WORKERS')
+    start = time.perf_counter()
+
+    pool = None
+    if kind != 'availability' and workers != 0:
+        pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        seen, touched = set(), set()
+        departments = {name.lower(): dep_id for dep_id, name in db.session.query(Department.id, Department.name)}
+        numbered = enumerate(records, start=1)
+        for batch in _batches(numbered, batch_size):
+            if kind == 'availability':
+                _import_availability(batch, report, touched)
+            else:
+                _import_users(batch, kind[:-1], report, seen, pool, rounds, departments)
+        if touched:
+            # the file may overlap itself or what the doctors already had
+            report.merged = normalise(db.session.connection(), touched)
+            db.session.commit()
+            # normalise writes on the bare connection, out of the session's sight
+            change_tracker.bump(DoctorAvailability.__tablename__)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    report.elapsed = time.perf_counter() - start
+    return report
+
+
+def import_file(kind, stream, filename, **options):
+    if isinstance(stream, (io.BufferedIOBase, io.RawIOBase)) or not hasattr(stream, 'encoding'):
+        stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    return import_records(kind, read_records(stream, filename), **options)
+
+
+@click.command('import-data')
+@click.argument('kind', type=click.Choice(KINDS))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', default=500, show_default=True)
+@click.option('--workers', type=int, default=None,
+              help='Hashing processes (default: one per cpu, 0 hashes in-process).')
+@with_appcontext
+def import_data_command(kind, path, batch_size, workers):
+    """Bulk import patients, doctors or availability from a csv/json/ndjson file."""
+    with open(path, encoding='utf-8-sig', newline='') as stream:
+        try:
+            report = import_file(kind, stream, path, batch_size=batch_size, workers=workers)
+        except ImportFileError as e:
+            raise click.ClickException(str(e))
+
+    for row_number, message in report.errors:
+        click.echo(f'row {row_number}: {message}', err=True)
+    click.echo(report.summary())
@@ -0,0 +1,258 @@
+# background jobs: slow, non-interactive work taken off the request path.
+# a job is a row in the jobs table of the app's own database, so it survives a
+# restart and is enqueued in the same transaction as the change that asks for
+# it. each process runs a few worker threads (JOB_WORKERS, started with the
+# first request) or none, with `flask --app app run-jobs` doing the work in a
+# separate process. a worker claims a due job with a conditional UPDATE, so two
+# workers never run the same one, runs it in its own app context and retries a
+# failure with exponential backoff. a job whose worker died is taken over once
+# its lease runs out.
+#   job_id = job_queue.enqueue('delete_user', user_id=7); db.session.commit()
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import Column, DateTime, Index, Integer, MetaData, String, Table, Text, and_, event, func, or_, select, update
+from sqlalchemy.orm import Session
+
+from models import db
+
+log = logging.getLogger(__name__)
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+
+_metadata = MetaData()
+jobs_table = Table(
+    'jobs', _metadata,
+    Column('id', Integer, primary_key=True),
+    Column('name', String(100), nullable=False),
+    Column('payload', Text, nullable=False),        # json keyword arguments
+    Column('status', String(20), nullable=False),
+    Column('attempts', Integer, nullable=False, default=0),
+    Column('max_attempts', Integer, nullable=False),
+    Column('run_after', DateTime, nullable=False),
+    Column('locked_until', DateTime),
+    Column('worker', String(100)),
+    Column('result', Text),                         # json return value
+    Column('error', Text),                          # last failure
+    Column('created_at', DateTime, nullable=False),
+    Column('finished_at', DateTime),
+    # due jobs, in order
+    Index('ix_jobs_status_run_after', 'status', 'run_after'),
+)
+
+
+# migration
+def create_job_table(conn):
+    _metadata.create_all(conn)
+
+
+def _row(job):
+    return {
+        'id': job.id,
+        'name': job.name,
+        'status': job.status,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'result': json.loads(job.result) if job.result else None,
+        'error': job.error,
+        'created_at': job.created_at.isoformat(),
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+class JobQueue:
+    def __init__(self, workers=2, max_attempts=3, lease=300, poll_interval=5):
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.tasks = {}         # name -> (function, max attempts or None)
+        self._wake = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.workers = app.config.setdefault('JOB_WORKERS', self.workers)
+        self.max_attempts = app.config.setdefault('JOB_MAX_ATTEMPTS', self.max_attempts)
+        self.lease = app.config.setdefault('JOB_LEASE_SECONDS', self.lease)
+        self.poll_interval = app.config.setdefault('JOB_POLL_SECONDS', self.poll_interval)
+        if self.workers:
+            app.before_request(lambda: self.start(current_app._get_current_object()))
+
+    # register a function as a job; its keyword arguments must be json-able
+    def task(self, name, max_attempts=None):
+        def register(fn):
+            self.tasks[name] = (fn, max_attempts)
+            return fn
+        return register
+
+    # queue a job in the current transaction; it runs once the caller commits
+    def enqueue(self, name, delay=0, **kwargs):
+        if name not in self.tasks:
+            raise KeyError(f'unknown job {name!r}')
+        now = datetime.utcnow()
+        result = db.session.execute(jobs_table.insert().values(
+            name=name,
+            payload=json.dumps(kwargs),
+            status=QUEUED,
+            attempts=0,
+            max_attempts=self.tasks[name][1] or self.max_attempts,
+            run_after=now + timedelta(seconds=delay),
+            created_at=now,
+        ))
+        # wake this process's workers on commit instead of waiting for the next poll
+        db.session.info['jobs_enqueued'] = True
+        return result.inserted_primary_key[0]
+
+    def status(self, job_id):
+        job = db.session.execute(select(jobs_table).where(jobs_table.c.id == job_id)).first()
+        return _row(job) if job else None
+
+    # {status: count} and the most recent jobs
+    def summary(self, limit=50):
+        counts = dict(db.session.execute(
+            select(jobs_table.c.status, func.count()).group_by(jobs_table.c.status)).all())
+        recent = db.session.execute(select(jobs_table).order_by(jobs_table.c.id.desc()).limit(limit))
+        return {'counts': counts, 'jobs': [_row(job) for job in recent]}
+
+    def _due(self, now):
+        return or_(
+            and_(jobs_table.c.status == QUEUED, jobs_table.c.run_after <= now),
+            # the worker holding it died or hung
+            and_(jobs_table.c.status == RUNNING, jobs_table.c.locked_until < now),
+        )
+
+    # the next due job, marked as running by `worker`, or None
+    def claim(self, worker):
+        now = datetime.utcnow()
+        candidates = db.session.execute(
+            select(jobs_table.c.id).where(self._due(now))
+            .order_by(jobs_table.c.run_after, jobs_table.c.id).limit(5)
+        ).scalars().all()
+        db.session.rollback()
+
+        for job_id in candidates:
+            # only one worker's update matches while the job is still due
+            with db.engine.begin() as conn:
+                claimed = conn.execute(
+                    update(jobs_table).where(jobs_table.c.id == job_id, self._due(now)).values(
+                        status=RUNNING,
+                        attempts=jobs_table.c.attempts + 1,
+                        locked_until=now + timedelta(seconds=self.lease),
+                        worker=worker,
+                    )
+                ).rowcount
+            if claimed:
+                return db.session.execute(select(jobs_table).where(jobs_table.c.id == job_id)).first()
+        return None
+
+    def _finish(self, job, worker, **values):
+        with db.engine.begin() as conn:
+            conn.execute(update(jobs_table).where(
+                jobs_table.c.id == job.id, jobs_table.c.worker == worker).values(**values))
+
+    # run a claimed job in a fresh app context, so it gets its own session
+    def run(self, job, worker):
+        task = self.tasks.get(job.name)
+        with current_app.app_context():
+            try:
+                if task is None:
+                    raise KeyError(f'unknown job {job.name!r}')
+                result = task[0](**json.loads(job.payload))
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                log.exception('job %s (%s) failed, attempt %d of %d', job.id, job.name, job.attempts, job.max_attempts)
+                error = f'{type(e).__name__}: {e}'
+                if job.attempts >= job.max_attempts:
+                    self._finish(job, worker, status=FAILED, error=error, finished_at=datetime.utcnow())
+                else:
+                    retry_at = datetime.utcnow() + timedelta(seconds=2 ** job.attempts)
+                    self._finish(job, worker, status=QUEUED, error=error, run_after=retry_at)
+                return False
+            self._finish(job, worker, status=DONE, result=json.dumps(result, default=str),
+                         finished_at=datetime.utcnow())
+            return True
+
+    # run due jobs until none are left; returns how many ran
+    def drain(self, worker=None):
+        worker = worker or f'{socket.gethostname()}:{os.getpid()}:drain'
+        count = 0
+        while (job := self.claim(worker)) is not None:
+            self.run(job, worker)
+            count += 1
+        return count
+
+    def _work(self, app, worker, stop):
+        with app.app_context():
+            while not stop.is_set():
+                try:
+                    job = self.claim(worker)
+                    if job is not None:
+                        self.run(job, worker)
+                        continue
+                except Exception:
+                    log.exception('job worker %s', worker)
+                    db.session.rollback()
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def start(self, app, workers=None, stop=None):
+        if self._threads:
+            return self._threads
+        with self._lock:
+            if self._threads:
+                return self._threads
+            stop = stop or threading.Event()
+            for i in range(workers or self.workers):
+                worker = f'{socket.gethostname()}:{os.getpid()}:{i}'
+                thread = threading.Thread(target=self._work, args=(app, worker, stop),
+                                          name=f'job-worker-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            return self._threads
+
+    def wake(self):
+        self._wake.set()
+
+
+job_queue = JobQueue()
+
+
+@event.listens_for(Session, 'after_commit')
+def _wake_workers(session):
+    if session.info.pop('jobs_enqueued', False):
+        job_queue.wake()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_enqueued(session):
+    session.info.pop('jobs_enqueued', None)
+
+
+@click.command('run-jobs')
+@click.option('--workers', default=2, show_default=True, help='Worker threads.')
+@click.option('--drain', is_flag=True, help='Run the jobs that are due now, then exit.')
+@with_appcontext
+def run_jobs_command(workers, drain):
+    """Run background jobs (for web processes started with JOB_WORKERS=0)."""
+    if drain:
+        click.echo(f'{job_queue.drain()} jobs run')
+        return
+    stop = threading.Event()
+    threads = job_queue.start(current_app._get_current_object(), workers, stop)
+    click.echo(f'{len(threads)} job workers running, ctrl-c to stop', err=True)
+    try:
+        while any(thread.is_alive() for thread in threads):
+            time.sleep(1)
+    except KeyboardInterrupt:
+        stop.set()
+        job_queue.wake()
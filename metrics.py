@@ -0,0 +1,160 @@
+# per-endpoint request metrics and the slow query log.
+# every request records its latency, how many SQL statements it ran and how
+# long they took, bucketed per endpoint; /admin/metrics serves the totals in
+# the prometheus text format. statements slower than SLOW_QUERY_MS are logged
+# with the route that ran them. numbers are per process, so with several
+# workers each one reports its own (scrape them individually).
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+from models import db
+
+log = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+    # prometheus lines for this histogram; counts are cumulative per bucket already
+    def lines(self, name, labels):
+        for bound, count in zip(self.buckets, self.counts):
+            yield f'{name}_bucket{{{labels},le="{bound:g}"}} {count}'
+        yield f'{name}_bucket{{{labels},le="+Inf"}} {self.count}'
+        yield f'{name}_sum{{{labels}}} {self.sum:.6f}'
+        yield f'{name}_count{{{labels}}} {self.count}'
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class RequestMetrics:
+    def __init__(self, slow_query_ms=200):
+        self.slow_query_ms = slow_query_ms
+        self._lock = threading.Lock()
+        self.reset()
+
+    def init_app(self, app):
+        self.slow_query_ms = app.config.setdefault('SLOW_QUERY_MS', self.slow_query_ms)
+        if not app.config.setdefault('METRICS_ENABLED', True):
+            return
+
+        app.before_request(self._start_request)
+        app.after_request(self._response_status)
+        # teardown runs after a streamed response has finished too
+        app.teardown_request(self._finish_request)
+
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', self._start_query)
+            event.listen(db.engine, 'after_cursor_execute', self._finish_query)
+            event.listen(db.engine, 'handle_error', self._failed_query)
+
+    def reset(self):
+        with self._lock:
+            # (endpoint, method) -> histogram
+            self.latency = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+            self.query_counts = defaultdict(lambda: Histogram(QUERY_COUNT_BUCKETS))
+            self.query_time = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+            # (endpoint, method, status) -> requests
+            self.responses = defaultdict(int)
+            self.slow_queries = defaultdict(int)    # endpoint -> statements over the threshold
+
+    # ---------------------------- request hooks -------------------------------
+
+    def _start_request(self):
+        g.metrics_start = time.perf_counter()
+        g.sql_queries = 0
+        g.sql_time = 0.0
+
+    def _response_status(self, response):
+        g.metrics_status = response.status_code
+        return response
+
+    def _finish_request(self, exc):
+        start = g.pop('metrics_start', None)
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        key = (request.endpoint or 'unmatched', request.method)
+        status = g.pop('metrics_status', 500)
+        with self._lock:
+            self.latency[key].observe(elapsed)
+            self.query_counts[key].observe(g.sql_queries)
+            self.query_time[key].observe(g.sql_time)
+            self.responses[key + (status,)] += 1
+
+    # ---------------------------- cursor hooks --------------------------------
+
+    # (execution context, start) per statement running on the connection
+    def _start_query(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metrics_query_start', []).append((context, time.perf_counter()))
+
+    # after_cursor_execute never fires for a statement that raised: drop its start here
+    def _failed_query(self, exception_context):
+        conn = exception_context.connection
+        stack = conn.info.get('metrics_query_start') if conn is not None else None
+        if stack and stack[-1][0] is exception_context.execution_context:
+            stack.pop()
+
+    def _finish_query(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['metrics_query_start'].pop()[1]
+        endpoint = '-'
+        if has_request_context() and 'sql_queries' in g:
+            g.sql_queries += 1
+            g.sql_time += elapsed
+            endpoint = request.endpoint or 'unmatched'
+
+        if self.slow_query_ms is not None and elapsed * 1000 >= self.slow_query_ms:
+            route = f'{request.method} {request.path} ({endpoint})' if has_request_context() else endpoint
+            log.warning('slow query: %.1f ms in %s: %s', elapsed * 1000, route, ' '.join(statement.split()))
+            with self._lock:
+                self.slow_queries[endpoint] += 1
+
+    # ---------------------------- exposition ----------------------------------
+
+    def render(self):
+        lines = []
+        with self._lock:
+            lines.append('# HELP http_requests_total Requests handled, by endpoint, method and status.')
+            lines.append('# TYPE http_requests_total counter')
+            for (endpoint, method, status), count in sorted(self.responses.items()):
+                lines.append(f'http_requests_total{{endpoint="{_label(endpoint)}",method="{method}",'
+                             f'status="{status}"}} {count}')
+
+            for name, help_text, histograms in (
+                ('http_request_duration_seconds', 'Request latency.', self.latency),
+                ('http_request_sql_queries', 'SQL statements run per request.', self.query_counts),
+                ('http_request_sql_duration_seconds', 'Time spent in SQL per request.', self.query_time),
+            ):
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} histogram')
+                for (endpoint, method), histogram in sorted(histograms.items()):
+                    lines.extend(histogram.lines(name, f'endpoint="{_label(endpoint)}",method="{method}"'))
+
+            lines.append(f'# HELP sql_slow_queries_total Statements slower than {self.slow_query_ms} ms.')
+            lines.append('# TYPE sql_slow_queries_total counter')
+            for endpoint, count in sorted(self.slow_queries.items()):
+                lines.append(f'sql_slow_queries_total{{endpoint="{_label(endpoint)}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+request_metrics = RequestMetrics()
@@ -0,0 +1,99 @@
+# lightweight schema migrations for existing databases.
+# db.create_all() only creates missing tables, so changes to tables that already
+# exist (indexes, constraints, ...) are listed here and applied once at startup.
+# applied versions are recorded in the schema_migrations table.
+import logging
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, bindparam, select, text
+from sqlalchemy.exc import IntegrityError
+
+from search import create_search_index
+from change_tracker import create_version_table, drop_version_triggers
+from availability import normalise
+from jobs import create_job_table
+
+log = logging.getLogger(__name__)
+
+_metadata = MetaData()
+schema_migrations = Table(
+    'schema_migrations', _metadata,
+    Column('version', Integer, primary_key=True),
+    Column('name', String(200), nullable=False),
+    Column('applied_at', DateTime, nullable=False),
+)
+
+
+def _create_indexes(*names):
+    def migrate(conn):
+        from models import db
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                if index.name in names:
+                    index.create(conn, checkfirst=True)
+    return migrate
+
+
+# existing double bookings would block the unique index: keep the earliest
+# booking of each slot and cancel the others
+def _unique_booked_slot(conn):
+    duplicates = conn.execute(text("""
+        SELECT a.id FROM appointments a
+        WHERE a.status = 'Booked' AND EXISTS (
+            SELECT 1 FROM appointments b
+            WHERE b.status = 'Booked' AND b.doctor_id = a.doctor_id
+              AND b.appointment_datetime = a.appointment_datetime AND b.id < a.id)
+    """)).scalars().all()
+    if duplicates:
+        log.warning('cancelling %d double-booked appointments: %s', len(duplicates), duplicates)
+        conn.execute(text("UPDATE appointments SET status = 'Cancelled' WHERE id IN :ids")
+                     .bindparams(bindparam('ids', expanding=True)), {'ids': duplicates})
+    _create_indexes('uq_appointments_booked_slot')(conn)
+
+
+def _merge_availability(conn):
+    merged = normalise(conn)
+    if merged:
+        log.warning('merged %d overlapping availability windows', merged)
+
+
+# (version, name, migrate(connection)) - append only, never renumber
+MIGRATIONS = [
+    (1, 'indexes for hot filter columns', _create_indexes(
+        'ix_users_role_first_name',
+        'ix_availability_doctor_date',
+        'ix_appointments_doctor_status_datetime',
+        'ix_appointments_patient_status_datetime',
+        'ix_appointments_datetime_id',
+    )),
+    (2, 'full-text search index for users', create_search_index),
+    (3, 'one booked appointment per doctor and time', _unique_booked_slot),
+    (4, 'per-table change counters', create_version_table),
+    (5, 'merge overlapping availability windows', _merge_availability),
+    (6, 'background job queue', create_job_table),
+    (7, 'table versions bumped after commit, not by triggers', drop_version_triggers),
+]
+
+
+def applied_versions(conn):
+    return set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+
+def run_migrations(engine, migrations=MIGRATIONS):
+    _metadata.create_all(engine)
+
+    applied = []
+    for version, name, migrate in migrations:
+        with engine.connect() as conn, conn.begin() as transaction:
+            if version in applied_versions(conn):
+                continue
+            migrate(conn)
+            try:
+                conn.execute(schema_migrations.insert().values(
+                    version=version, name=name, applied_at=datetime.utcnow()))
+            except IntegrityError:
+                # another worker applied it first
+                transaction.rollback()
+                continue
+        applied.append(version)
+    return applied
@@ -21,6 +21,10 @@ class Department(db.Model):
 # users db schema
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
+    __table_args__ = (
+        # role filtered lists ordered by name (admin lists, api, search)
+        db.Index('ix_users_role_first_name', 'role', 'first_name', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(150), unique=True, nullable=False)
     password = db.Column(db.String(200), nullable=False)
@@ -51,6 +55,10 @@ class User(UserMixin, db.Model):
 # doctor availability
 class DoctorAvailability(db.Model):
     __tablename__ = 'doctor_availability'
+    __table_args__ = (
+        # a doctor's windows over a date range (booking, availability page)
+        db.Index('ix_availability_doctor_date', 'doctor_id', 'available_date'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     doctor_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -70,6 +78,16 @@ class DoctorAvailability(db.Model):
 # appointment db schema
 class Appointment(db.Model):
     __tablename__ = 'appointments'
+    __table_args__ = (
+        # doctor/patient dashboards and slot lookups: filter on person + status, order by time
+        db.Index('ix_appointments_doctor_status_datetime', 'doctor_id', 'status', 'appointment_datetime'),
+        db.Index('ix_appointments_patient_status_datetime', 'patient_id', 'status', 'appointment_datetime'),
+        # admin list and api pagination order
+        db.Index('ix_appointments_datetime_id', 'appointment_datetime', 'id'),
+        # a doctor can only have one booked appointment per slot - see booking.py
+        db.Index('uq_appointments_booked_slot', 'doctor_id', 'appointment_datetime', unique=True,
+                 sqlite_where=db.text("status = 'Booked'"), postgresql_where=db.text("status = 'Booked'")),
+    )
     id = db.Column(db.Integer, primary_key=True)
 
     # for patient
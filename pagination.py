@@ -0,0 +1,152 @@
+# keyset (cursor) pagination.
+# a page continues from the sort key of the last row seen instead of using
+# OFFSET, so fetching page 1000 costs the same as page 1. cursors are opaque
+# url-safe strings holding that key and the direction to move in.
+import base64
+import json
+from datetime import date, datetime
+
+from flask import abort, current_app, request, url_for
+from sqlalchemy import and_, or_
+
+
+class Page:
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    # same endpoint and query string, different cursor
+    def url(self, cursor):
+        args = {**request.view_args, **request.args.to_dict()}
+        args['cursor'] = cursor
+        return url_for(request.endpoint, **args)
+
+    @property
+    def next_url(self):
+        return self.url(self.next_cursor) if self.next_cursor else None
+
+    @property
+    def prev_url(self):
+        return self.url(self.prev_cursor) if self.prev_cursor else None
+
+    # X-Next-Cursor / X-Prev-Cursor plus a Link header for API responses
+    def headers(self):
+        headers, links = {}, []
+        if self.next_cursor:
+            headers['X-Next-Cursor'] = self.next_cursor
+            links.append(f'<{self.next_url}>; rel="next"')
+        if self.prev_cursor:
+            headers['X-Prev-Cursor'] = self.prev_cursor
+            links.append(f'<{self.prev_url}>; rel="prev"')
+        if links:
+            headers['Link'] = ', '.join(links)
+        return headers
+
+
+def _dump(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    if isinstance(value, date):
+        return {'d': value.isoformat()}
+    return value
+
+
+def _load(value):
+    if isinstance(value, dict):
+        if 'dt' in value:
+            return datetime.fromisoformat(value['dt'])
+        return date.fromisoformat(value['d'])
+    return value
+
+
+def encode_cursor(key, direction):
+    payload = json.dumps({'k': [_dump(v) for v in key], 'd': direction}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        key = tuple(_load(v) for v in payload['k'])
+        direction = payload['d']
+    except (ValueError, KeyError, TypeError):
+        raise ValueError('invalid cursor')
+    if direction not in ('next', 'prev'):
+        raise ValueError('invalid cursor')
+    return key, direction
+
+
+# rows strictly after `key` in the given order, e.g. for (a desc, id desc):
+#   a < :a OR (a = :a AND id < :id)
+def _after(order, key):
+    clauses = []
+    for i, (column, descending) in enumerate(order):
+        equal = [col == value for (col, _), value in zip(order[:i], key)]
+        beyond = column < key[i] if descending else column > key[i]
+        clauses.append(and_(*equal, beyond))
+    return or_(*clauses)
+
+
+# order is a list of (column, descending) pairs ending in a unique column,
+# e.g. [(Appointment.appointment_datetime, True), (Appointment.id, True)].
+# returns the query narrowed to one page (plus a lookahead row) and a function
+# that turns its rows into a Page; works on a Query or a select(), so the
+# async api (asgi.py) can run the statement itself
+def keyset_query(query, order, cursor=None, limit=50):
+    def key_of(item):
+        return tuple(getattr(item, column.key) for column, _ in order)
+
+    direction = 'next'
+    if cursor:
+        key, direction = decode_cursor(cursor)
+        if len(key) != len(order):
+            raise ValueError('invalid cursor')
+
+    # walking backwards is walking forwards over the reversed order
+    walk = order if direction == 'next' else [(col, not desc) for col, desc in order]
+    if cursor:
+        query = query.filter(_after(walk, key))
+    query = query.order_by(*[col.desc() if desc else col.asc() for col, desc in walk])
+
+    def page(rows):
+        # the extra row tells us whether there is another page
+        rows = list(rows)
+        more = len(rows) > limit
+        rows = rows[:limit]
+
+        if direction == 'prev':
+            rows.reverse()
+            next_cursor = encode_cursor(key_of(rows[-1]), 'next') if rows else None
+            prev_cursor = encode_cursor(key_of(rows[0]), 'prev') if rows and more else None
+        else:
+            next_cursor = encode_cursor(key_of(rows[-1]), 'next') if rows and more else None
+            prev_cursor = encode_cursor(key_of(rows[0]), 'prev') if rows and cursor else None
+        return Page(rows, next_cursor, prev_cursor)
+
+    return query.limit(limit + 1), page
+
+
+def keyset_page(query, order, cursor=None, limit=50):
+    query, page = keyset_query(query, order, cursor, limit)
+    return page(query.all())
+
+
+# page from ?cursor=&limit=, limit clamped to MAX_PAGE_SIZE
+def paginate(query, order):
+    default = current_app.config.get('PAGE_SIZE', 50)
+    maximum = current_app.config.get('MAX_PAGE_SIZE', 500)
+
+    limit = request.args.get('limit', default, type=int)
+    limit = max(1, min(limit, maximum))
+    try:
+        return keyset_page(query, order, request.args.get('cursor'), limit)
+    except ValueError:
+        abort(400, description='Invalid pagination cursor.')
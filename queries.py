@@ -0,0 +1,46 @@
+# query builders that eager load what list pages render, so a page costs a
+# fixed number of queries however many rows it shows, e.g.
+#   AppointmentQuery().with_people().with_treatment().filter(...).all()
+from sqlalchemy.orm import Query, joinedload, selectinload
+
+from models import Appointment, User
+
+# keyset pagination orders, see pagination.keyset_page
+APPOINTMENT_ORDER = [(Appointment.appointment_datetime, True), (Appointment.id, True)]
+NAME_ORDER = [(User.first_name, False), (User.id, False)]
+
+
+class AppointmentQuery:
+    def __init__(self, query=None):
+        self.query = query if query is not None else Appointment.query
+
+    def _options(self, *options):
+        return AppointmentQuery(self.query.options(*options))
+
+    # many appointments share a patient/doctor, so load the distinct users in one IN query
+    def with_patient(self):
+        return self._options(selectinload(Appointment.patient))
+
+    def with_doctor(self):
+        return self._options(selectinload(Appointment.doctor))
+
+    def with_people(self):
+        return self.with_patient().with_doctor()
+
+    # one-to-one, cheapest as part of the main SELECT
+    def with_treatment(self):
+        return self._options(joinedload(Appointment.treatment))
+
+    # everything else (filter, order_by, all, ...) goes to the wrapped query
+    def __getattr__(self, name):
+        attr = getattr(self.query, name)
+        if not callable(attr):
+            return attr
+
+        def wrapper(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            return AppointmentQuery(result) if isinstance(result, Query) else result
+        return wrapper
+
+    def __iter__(self):
+        return iter(self.query)
@@ -1,13 +1,23 @@
-from flask import Blueprint, url_for, render_template, redirect, request, flash
+from flask import (Blueprint, url_for, render_template, redirect, request, flash, Response, abort,
+                   stream_with_context, current_app, jsonify)
 from flask_login import login_required
-from sqlalchemy import func
 from datetime import datetime
 
 from routes.auth import bcrypt, check_user_role
-from models import db, User, Department, Appointment
-
-from chart import plot_to_img
-import matplotlib.pyplot as plt
+from models import db, User, Department
+
+from chart import draw as draw_chart
+from chart_data import ADMIN_CHARTS
+from chart_cache import chart_cache
+import stats
+from queries import AppointmentQuery, APPOINTMENT_ORDER, NAME_ORDER
+from pagination import paginate
+from search import search_users, DOCTOR_FIELDS, PATIENT_FIELDS
+from export import FORMATS, export_chunks
+from importer import KINDS, ImportFileError, import_file
+from metrics import request_metrics
+from http_cache import conditional
+from jobs import job_queue
 
 
 admin = Blueprint('admin', __name__)
@@ -17,82 +27,48 @@ admin = Blueprint('admin', __name__)
 def dashboard():
     check_user_role('admin')
 
-    status_counts = (
-        db.session.query(Appointment.status, db.func.count(Appointment.id))
-        .group_by(Appointment.status)
-        .all()
-    )
-
-    labels = [status for status, _ in status_counts]
-    values = [count for _, count in status_counts]
-
-    # Pie chart for appointment status
-    plt.figure(figsize=(4, 4))
-    plt.pie(values, labels=labels, autopct='%1.1f%%', startangle=90)
-    plt.title("Appointment Status Distribution")
-    appointment_chart = plot_to_img()
-
-    # Patient age distribution
-    patients = User.query.filter_by(role='patient').all()
-    from datetime import date as _date
-    ages = []
-    for p in patients:
-        dob = getattr(p, 'dob', None)
-        if not dob:
-            continue
-        try:
-            dob_date = dob if isinstance(dob, _date) else dob.date()
-            today = _date.today()
-            age = today.year - dob_date.year - ((today.month, today.day) < (dob_date.month, dob_date.day))
-            if age >= 0:
-                ages.append(age)
-        except Exception:
-            continue
-
-    plt.figure(figsize=(5, 3))
-    plt.hist(ages, bins=5, color='skyblue', edgecolor='black')
-    plt.title("Patient Age Distribution")
-    plt.xlabel("Age")
-    plt.ylabel("Count")
-    age_chart = plot_to_img()
-
-    doctors = User.query.filter_by(role='doctor').all()
-    spec_counts = {}
-    for d in doctors:
-        spec = getattr(d, 'specialization', None)
-        spec_name = spec.name if spec and hasattr(
-            spec, 'name') else (str(spec) if spec else 'Unknown')
-        spec_counts[spec_name] = spec_counts.get(spec_name, 0) + 1
-
-    labels = list(spec_counts.keys())
-    values = list(spec_counts.values())
-    x = list(range(len(labels)))
-
-    plt.figure(figsize=(5, 3))
-    plt.bar(x, values, color='lightgreen')
-    plt.title("Doctors per Specialization")
-    plt.xticks(x, labels, rotation=30)
-    spec_chart = plot_to_img()
+    # client: the page carries the series and the browser draws them.
+    # server: cached pngs, rendered in the background (see chart_cache.py)
+    charts, images = {}, {}
+    for name, (loader, tables) in ADMIN_CHARTS.items():
+        if current_app.config['CHART_RENDERER'] == 'client':
+            charts[name] = loader()
+        else:
+            images[name] = chart_cache.get(name, tables, loader, draw_chart)
 
+    roles = stats.role_counts()
     return render_template(
         'admin/dashboard.html',
-        appointment_chart=appointment_chart,
-        age_chart=age_chart,
-        spec_chart=spec_chart,
-        total_patients=len(patients),
-        total_doctors=len(doctors)
+        charts=charts,
+        images=images,
+        total_patients=roles.get('patient', 0),
+        total_doctors=roles.get('doctor', 0)
     )
 
 
+# series behind a dashboard chart, for the browser or other clients
+@admin.route('/charts/<name>.json')
+@login_required
+def chart_json(name):
+    denied = check_user_role('admin')
+    if denied:
+        return denied
+    if name not in ADMIN_CHARTS:
+        abort(404)
+    loader, _ = ADMIN_CHARTS[name]
+    return jsonify(loader())
+
+
 # -------------------DOCTOR--------------------------------------------------------------------------------------------------
 
 # doctor control
 @admin.route('/view_doctors')
 @login_required
+@conditional('users', 'departments', cache_control='private, no-cache', per_user=True)
 def view_doctors():
     check_user_role('admin')
 
-    doctors = User.query.filter_by(role='doctor').all()
+    doctors = paginate(User.query.filter_by(role='doctor'), NAME_ORDER)
     return render_template('admin/doctor/doctors.html', doctors=doctors)
 
 # register doctor
@@ -186,9 +162,10 @@ def delete_doctor(id):
         flash('Invalid user ID.', 'danger')
         return redirect(url_for('admin.view_doctors'))
 
-    db.session.delete(doctor)
+    # appointments, treatments and availability go with them, in the background
+    job_queue.enqueue('delete_user', user_id=doctor.id)
     db.session.commit()
-    flash('Doctor has been removed/blacklisted from the system.', 'success')
+    flash('Doctor is being removed/blacklisted from the system.', 'success')
     return redirect(url_for('admin.view_doctors'))
 
 
@@ -201,14 +178,7 @@ def search_doctors():
     query = request.args.get('search', '').strip()
 
     if query:
-        filtered_doctors = User.query.filter(
-            User.role == 'doctor',
-            (
-                func.concat(User.first_name, ' ', User.last_name).ilike(f"%{query}%") |
-                User.qualification.ilike(f"%{query}%")
-            )
-        ).all()
-        print(filtered_doctors)
+        filtered_doctors = search_users(query, 'doctor', DOCTOR_FIELDS)
     else:
         filtered_doctors = User.query.filter_by(role='doctor').all()
 
@@ -222,7 +192,7 @@ def search_doctors():
 @login_required
 def view_patients():
     check_user_role('admin')
-    patients = User.query.filter_by(role='patient').order_by(User.first_name).all()
+    patients = paginate(User.query.filter_by(role='patient'), NAME_ORDER)
     return render_template('admin/patient/patients.html', patients=patients)
 
 # update patien
@@ -276,9 +246,9 @@ def delete_patient(id):
         flash('Invalid user ID.', 'danger')
         return redirect(url_for('admin.view_patients'))
 
-    db.session.delete(patient)
+    job_queue.enqueue('delete_user', user_id=patient.id)
     db.session.commit()
-    flash('Patient has been removed/blacklisted from the system.', 'success')
+    flash('Patient is being removed/blacklisted from the system.', 'success')
     return redirect(url_for('admin.view_patients'))
 
 # search/filter patient
@@ -288,12 +258,9 @@ def search_patients():
     query = request.args.get('search', '')
     results = []
     if query:
-        results = (User.query.filter_by(role='patient').filter(
-            func.concat(User.first_name, ' ', User.last_name).ilike(f"%{query}%") |
-            (User.email.ilike(f"%{query}%")) | (User.contact_number.ilike(f"%{query}%")))
-            .all())
-    # Also retrieve full list of patients to show below
-    patients = User.query.filter_by(role='patient').all()
+        results = search_users(query, 'patient', PATIENT_FIELDS)
+    # Also retrieve the list of patients to show below
+    patients = paginate(User.query.filter_by(role='patient'), NAME_ORDER)
     return render_template('admin/patient/patients.html', results=results, query=query, patients=patients)
 
 # appointment table
@@ -303,7 +270,7 @@ def view_appointments():
     check_user_role('admin')
 
     sort_by = request.args.get('sort', '').lower()
-    query = Appointment.query
+    query = AppointmentQuery().with_people().with_treatment()
 
     if sort_by == 'booked':
         query = query.filter_by(status='Booked')
@@ -312,9 +279,84 @@ def view_appointments():
     elif sort_by == 'cancelled':
         query = query.filter_by(status='Cancelled')
 
-    appointments = query.order_by(
-        Appointment.appointment_datetime.desc()).all()
+    appointments = paginate(query, APPOINTMENT_ORDER)
 
     return render_template('admin/appointment/appointments.html',
                            appointments=appointments,
                            current_sort=sort_by)
+
+
+# full appointment dump, streamed as csv or ndjson
+@admin.route('/export/appointments.<fmt>')
+@login_required
+def export_appointments(fmt):
+    denied = check_user_role('admin')
+    if denied:
+        return denied
+    if fmt not in FORMATS:
+        abort(404)
+
+    return Response(
+        stream_with_context(export_chunks(fmt)),
+        mimetype=FORMATS[fmt],
+        headers={'Content-Disposition': f'attachment; filename=appointments.{fmt}'}
+    )
+
+
+# bulk import of patients, doctors or availability from an uploaded file
+@admin.route('/import', methods=['GET', 'POST'])
+@login_required
+def bulk_import():
+    denied = check_user_role('admin')
+    if denied:
+        return denied
+
+    report = None
+    if request.method == 'POST':
+        kind = request.form.get('kind')
+        upload = request.files.get('file')
+        if kind not in KINDS or not upload or not upload.filename:
+            flash('Choose what to import and a file.', 'warning')
+            return redirect(url_for('admin.bulk_import'))
+
+        try:
+            report = import_file(kind, upload.stream, upload.filename)
+        except (ImportFileError, ValueError, UnicodeDecodeError) as e:
+            db.session.rollback()
+            flash(f'Could not read file: {e}', 'danger')
+            return redirect(url_for('admin.bulk_import'))
+        flash(report.summary(), 'success' if not report.errors else 'warning')
+
+    return render_template('admin/import.html', kinds=KINDS, report=report)
+
+
+# request latency and sql counts per endpoint, prometheus text format
+@admin.route('/metrics')
+@login_required
+def metrics():
+    denied = check_user_role('admin')
+    if denied:
+        return denied
+    return Response(request_metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+# background jobs: counts by status and the latest jobs, or one job
+@admin.route('/jobs')
+@login_required
+def jobs():
+    denied = check_user_role('admin')
+    if denied:
+        return denied
+    return jsonify(job_queue.summary())
+
+
+@admin.route('/jobs/<int:job_id>')
+@login_required
+def job_status(job_id):
+    denied = check_user_role('admin')
+    if denied:
+        return denied
+    job = job_queue.status(job_id)
+    if job is None:
+        abort(404)
+    return jsonify(job)
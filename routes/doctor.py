@@ -1,12 +1,14 @@
-from flask import Blueprint, url_for, render_template, redirect, request, flash
+from flask import Blueprint, url_for, render_template, redirect, request, flash, current_app, jsonify
 from flask_login import login_required, current_user
 from datetime import date, timedelta, datetime
 
 from routes.auth import check_user_role
 from models import db, User, Appointment, Treatment, DoctorAvailability
 
-from chart import plot_to_img
-import matplotlib.pyplot as plt
+from availability import add_window
+from chart_data import weekly_load
+from queries import AppointmentQuery
+from chart import draw as draw_chart
 
 doctor = Blueprint('doctor', __name__)
 
@@ -19,7 +21,7 @@ def dashboard():
     check_user_role('doctor')
 
     appointments = (
-        Appointment.query.filter(
+        AppointmentQuery().with_patient().filter(
             Appointment.doctor_id == current_user.id,
             Appointment.status == 'Booked',
         )
@@ -28,7 +30,7 @@ def dashboard():
     )
 
     past_appt = (
-        Appointment.query.filter(
+        AppointmentQuery().with_patient().filter(
             Appointment.doctor_id == current_user.id,
             Appointment.status != 'Booked',
         )
@@ -44,24 +46,19 @@ def dashboard():
 def stats():
     check_user_role('doctor')
 
-    # Chart
-    appts = (
-        Appointment.query.filter_by(doctor_id=current_user.id)
-        .all()
-    )
-    day_counts = {}
-    for appt in appts:
-        day = appt.appointment_datetime.strftime('%A')
-        day_counts[day] = day_counts.get(day, 0) + 1
+    spec = weekly_load(current_user.id)
+    if current_app.config['CHART_RENDERER'] == 'client':
+        return render_template('doctor/statistics.html', charts={'weekly_load': spec})
+    return render_template('doctor/statistics.html', charts={}, images={'weekly_load': draw_chart(spec)})
 
-    plt.figure(figsize=(5, 3))
-    plt.bar(day_counts.keys(), day_counts.values(), color='orange')
-    plt.title("Weekly Appointment Load")
-    plt.xlabel("Day")
-    plt.ylabel("Appointments")
-    chart = plot_to_img()
 
-    return render_template('doctor/statistics.html', chart=chart)
+@doctor.route('/charts/weekly_load.json')
+@login_required
+def weekly_load_json():
+    denied = check_user_role('doctor')
+    if denied:
+        return denied
+    return jsonify(weekly_load(current_user.id))
 
 
 @doctor.route('/profile')
@@ -148,8 +145,9 @@ def patient_history(id):
 
     patient = User.query.get_or_404(id)
     history = (
-        Appointment.query.filter_by(patient_id=id, status='Completed')
-        .join(Treatment)
+        AppointmentQuery().with_treatment()
+        .filter_by(patient_id=id, status='Completed')
+        .filter(Appointment.treatment.has())
         .order_by(Appointment.appointment_datetime.desc())
         .all()
     )
@@ -176,15 +174,13 @@ def availability():
             elif available_date < date.today():
                 flash('Cannot set past availability.', 'danger')
             else:
-                new_slot = DoctorAvailability(
-                    doctor_id=current_user.id,
-                    available_date=available_date,
-                    start_time=start,
-                    end_time=end
-                )
-                db.session.add(new_slot)
+                # overlapping or touching windows are joined into one
+                window, merged = add_window(current_user.id, available_date, start, end)
                 db.session.commit()
-                flash('Availability added successfully.', 'success')
+                if merged:
+                    flash(f'Availability merged into {window.start_time:%H:%M}-{window.end_time:%H:%M}.', 'success')
+                else:
+                    flash('Availability added successfully.', 'success')
 
         except Exception as e:
             db.session.rollback()
@@ -1,14 +1,18 @@
-from flask import Blueprint, url_for, render_template, redirect, request, flash
+from flask import Blueprint, url_for, render_template, redirect, request, flash, current_app, jsonify
 from flask_login import login_required, current_user
-from sqlalchemy import func
 from datetime import date, timedelta, datetime
-import math
 
 from routes.auth import check_user_role
-from models import db, User, Appointment, DoctorAvailability, Department
+from models import db, User, Appointment, Department
+from slots import free_slots
+from booking import reserve_slot, SlotUnavailable
+from chart_data import patient_status
+from queries import AppointmentQuery
+from search import search_users, DOCTOR_DEPARTMENT_FIELDS
+from http_cache import conditional
+from first_available import first_available
 
-from chart import plot_to_img
-import matplotlib.pyplot as plt
+from chart import draw as draw_chart
 
 patient = Blueprint('patient', __name__)
 
@@ -18,12 +22,12 @@ patient = Blueprint('patient', __name__)
 def dashboard():
     check_user_role('patient')
     
-    upcoming = Appointment.query.filter(
+    upcoming = AppointmentQuery().with_doctor().filter(
         Appointment.patient_id == current_user.id,
         Appointment.status == 'Booked',
     ).order_by(Appointment.appointment_datetime.asc()).all()
 
-    past = Appointment.query.filter(
+    past = AppointmentQuery().with_doctor().filter(
         Appointment.patient_id == current_user.id,
         Appointment.status.in_(['Completed', 'Cancelled'])
     ).order_by(Appointment.appointment_datetime.desc()).all()
@@ -37,36 +41,19 @@ def dashboard():
 def stats():
     check_user_role('patient')
 
-       # chart
-    appts = Appointment.query.filter_by(patient_id=current_user.id).all()
-    counts = {'Booked': 0, 'Completed': 0, 'Cancelled': 0}
-    for appt in appts:
-        if appt.status in counts:
-            counts[appt.status] += 1
-
-    labels = list(counts.keys())
-    raw_values = list(counts.values())
-    values = []
-    for v in raw_values:
-        try:
-            fv = float(v)
-            if math.isnan(fv) or fv < 0:
-                fv = 0.0
-        except Exception:
-            fv = 0.0
-        values.append(fv)
-    total = sum(values)
-
-    plt.figure(figsize=(4, 4))
-    if total > 0:
-        plt.pie(values, labels=labels, autopct='%1.1f%%', startangle=90)
-    else:
-        # no valid data  render a neutral placeholder pie
-        plt.pie([1], labels=['No data'], colors=['#dddddd'])
+    spec = patient_status(current_user.id)
+    if current_app.config['CHART_RENDERER'] == 'client':
+        return render_template('patient/statistics.html', charts={'appointment_status': spec})
+    return render_template('patient/statistics.html', charts={}, images={'appointment_status': draw_chart(spec)})
 
-    pie_img = plot_to_img()
 
-    return render_template('patient/statistics.html' , chart=pie_img)
+@patient.route('/charts/appointment_status.json')
+@login_required
+def appointment_status_json():
+    denied = check_user_role('patient')
+    if denied:
+        return denied
+    return jsonify(patient_status(current_user.id))
 
 # view profile
 @patient.route('/profile', methods=['GET', 'POST'])
@@ -116,24 +103,18 @@ def update_profile():
 # find doctor
 @patient.route('/find_doctors')
 @login_required
+@conditional('users', 'departments', cache_control='private, no-cache', per_user=True)
 def find_doctors():
     query = request.args.get('search', '').strip()
 
     if query:
-        filtered_doctors = User.query.join(Department, User.specialization_id == Department.id).filter(
-            User.role == 'doctor',
-            (
-                func.concat(User.first_name, ' ', User.last_name).ilike(f"%{query}%") |
-                User.qualification.ilike(f"%{query}%") |
-                Department.description.ilike(f"%{query}%") |
-                Department.name.ilike(f"%{query}%") 
-            )
-        ).all()
-        print(filtered_doctors)
+        filtered_doctors = search_users(query, 'doctor', DOCTOR_DEPARTMENT_FIELDS)
     else:
         filtered_doctors = User.query.filter_by(role='doctor').all()
 
-    return render_template('patient/find_doctors.html', doctors=filtered_doctors, query=query)
+    departments = Department.query.order_by(Department.name).all()
+    return render_template('patient/find_doctors.html', doctors=filtered_doctors, query=query,
+                           departments=departments)
 
 # booking appointment
 @patient.route('/book_appointment/<int:doctor_id>', methods=['GET', 'POST'])
@@ -151,26 +132,12 @@ def book_appointment(doctor_id):
                 request.form['appointment_datetime'])
             reason = request.form['reason']
 
-            # Check for slot conflicts
-            conflict = Appointment.query.filter_by(
-                doctor_id=doctor_id,
-                appointment_datetime=appointment_datetime,
-                status='Booked'
-            ).first()
-
-            if conflict:
-                flash('That time slot is already booked.', 'danger')
+            # the insert fails if someone else holds the slot, see booking.py
+            try:
+                reserve_slot(current_user.id, doctor_id, appointment_datetime, reason)
+            except SlotUnavailable as e:
+                flash(str(e), 'danger')
             else:
-                new_appointment = Appointment(
-                    patient_id=current_user.id,
-                    doctor_id=doctor_id,
-                    appointment_datetime=appointment_datetime,
-                    reason=reason,
-                    status='Booked',
-                    created_at=datetime.utcnow()
-                )
-                db.session.add(new_appointment)
-                db.session.commit()
                 flash('Appointment booked successfully!', 'success')
                 return redirect(url_for('patient.dashboard'))
 
@@ -182,40 +149,43 @@ def book_appointment(doctor_id):
     # Show available slots from DoctorAvailability
     today = date.today()
     next_week = today + timedelta(days=7)
-
-    availability_records = DoctorAvailability.query.filter(
-        DoctorAvailability.doctor_id == doctor_id,
-        DoctorAvailability.available_date.between(today, next_week)
-    ).order_by(DoctorAvailability.available_date).all()
-
-    available_slots = {}
-    for record in availability_records:
-        slots = []
-        start_dt = datetime.combine(record.available_date, record.start_time)
-        end_dt = datetime.combine(record.available_date, record.end_time)
-
-        # Generate 30-min slots
-        current_slot = start_dt
-        while current_slot < end_dt:
-            # Check if already booked
-            booked = Appointment.query.filter_by(
-                doctor_id=doctor_id,
-                appointment_datetime=current_slot,
-                status='Booked'
-            ).first()
-
-            if not booked:
-                slots.append(current_slot)
-            current_slot += timedelta(minutes=30)
-
-        if slots:
-            available_slots[record.available_date] = slots
+    available_slots = free_slots(doctor_id, today, next_week)
 
     return render_template('patient/book_appointment.html',
                            doctor=doctor,
                            available_slots=available_slots)
 
 
+# earliest free slots with any doctor of a department, booked straight from the list
+@patient.route('/first_available/<int:department_id>', methods=['GET', 'POST'])
+@login_required
+def first_available_slots(department_id):
+    if current_user.role != 'patient':
+        flash('Only patients can book appointments.', 'danger')
+        return redirect(url_for('home'))
+
+    department = Department.query.get_or_404(department_id)
+
+    if request.method == 'POST':
+        try:
+            # "<doctor id>/<slot iso datetime>"
+            doctor_id, when = request.form['slot'].split('/', 1)
+            doctor = User.query.filter_by(id=int(doctor_id), role='doctor',
+                                          specialization_id=department.id).first_or_404()
+            reserve_slot(current_user.id, doctor.id, datetime.fromisoformat(when), request.form['reason'])
+        except SlotUnavailable as e:
+            flash(str(e), 'danger')
+        except (KeyError, ValueError):
+            flash('Choose a slot.', 'danger')
+        else:
+            flash('Appointment booked successfully!', 'success')
+            return redirect(url_for('patient.dashboard'))
+        return redirect(url_for('patient.first_available_slots', department_id=department_id))
+
+    slots = first_available.get(department.id, request.args.get('count', type=int))
+    return render_template('patient/first_available.html', department=department, slots=slots)
+
+
 # cancel appointment
 @patient.route('/appointment/cancel/<int:id>', methods=['POST'])
 @login_required
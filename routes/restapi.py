@@ -1,54 +1,94 @@
-from flask import Blueprint, request
+from flask import Blueprint, request, current_app
 from flask_restful import Resource, Api
 from models import db, User, Appointment
-from datetime import datetime
+from datetime import datetime, timedelta
+from sqlalchemy.exc import IntegrityError
+
+from pagination import paginate
+from queries import APPOINTMENT_ORDER, NAME_ORDER
+from appointment_batch import apply_batch, STATUSES
+from booking import reserve_slot, slot_taken, SlotUnavailable
+from http_cache import conditional
+from availability import availability_index, doctors_by_id
+from first_available import first_available
+from serializers import dumps, DOCTOR, PATIENT, APPOINTMENT
 
 api_bp = Blueprint('api', __name__)
 api = Api(api_bp)
 
 
+# a page of rows matching criteria, only the columns of the ?fields= asked for,
+# encoded by serializers.dumps
+def serialized_page(fields, order, *criteria):
+    try:
+        names = fields.parse(request.args.get('fields'))
+    except ValueError as e:
+        return {"error": str(e)}, 400
+    columns = fields.columns(names, order)
+    page = paginate(db.session.query(*columns).filter(*criteria), order)
+    return current_app.response_class(dumps(fields.dicts(page, names, columns)),
+                                      mimetype='application/json', headers=page.headers())
+
+
 class DoctorList(Resource):
+    # public directory, kiosks may reuse it for a minute before revalidating
+    @conditional('users', cache_control='public, max-age=60')
     def get(self):
-        doctors = User.query.filter_by(role='doctor').all()
-        return [{"id": d.id, "name": f"{d.first_name} {d.last_name}", "department": d.qualification} for d in doctors], 200
+        return serialized_page(DOCTOR, NAME_ORDER, User.role == 'doctor')
 
 
 class PatientList(Resource):
+    # personal data: never in shared caches, revalidate on every use
+    @conditional('users', cache_control='private, no-cache')
     def get(self):
-        patients = User.query.filter_by(role='patient').all()
-        return [{"id": p.id, "name": f"{p.first_name} {p.last_name}", "contact": p.contact_number} for p in patients], 200
+        return serialized_page(PATIENT, NAME_ORDER, User.role == 'patient')
 
 
 class AppointmentAPI(Resource):
     def get(self):
-        appointments = Appointment.query.all()
-        return [{
-            "id": a.id,
-            "doctor_id": a.doctor_id,
-            "patient_id": a.patient_id,
-            "datetime": a.appointment_datetime.isoformat(),
-            "status": a.status
-        } for a in appointments], 200
+        return serialized_page(APPOINTMENT, APPOINTMENT_ORDER)
 
     def post(self):
-        data = request.get_json()
-        new_appointment = Appointment(
-            doctor_id=data['doctor_id'],
-            patient_id=data['patient_id'],
-            appointment_datetime=datetime.fromisoformat(data['datetime']),
-            status='Booked'
-        )
-        db.session.add(new_appointment)
-        db.session.commit()
-        return {"message": "Appointment created successfully"}, 201
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return {"error": "Expected a json object"}, 400
+        for field in ('patient_id', 'doctor_id'):
+            if not isinstance(data.get(field), int) or isinstance(data[field], bool):
+                return {"error": f"{field} must be an integer"}, 400
+        try:
+            when = datetime.fromisoformat(data['datetime'])
+        except (KeyError, TypeError, ValueError):
+            return {"error": "datetime must be an ISO 8601 date and time"}, 400
+
+        roles = dict(db.session.query(User.id, User.role).filter(User.id.in_([data['patient_id'], data['doctor_id']])))
+        if roles.get(data['doctor_id']) != 'doctor':
+            return {"error": "Doctor not found"}, 404
+        if roles.get(data['patient_id']) != 'patient':
+            return {"error": "Patient not found"}, 404
+
+        try:
+            new_appointment = reserve_slot(data['patient_id'], data['doctor_id'], when, data.get('reason'))
+        except SlotUnavailable as e:
+            return {"error": str(e)}, 409
+        return {"message": "Appointment created successfully", "id": new_appointment.id}, 201
 
     def put(self):
         data = request.get_json()
         appt = Appointment.query.get(data['id'])
         if not appt:
             return {"error": "Appointment not found"}, 404
-        appt.status = data.get('status', appt.status)
-        db.session.commit()
+        status = data.get('status', appt.status)
+        if status not in STATUSES:
+            return {"error": f"status must be one of {', '.join(STATUSES)}"}, 400
+        appt.status = status
+        try:
+            db.session.commit()
+        except IntegrityError as e:
+            db.session.rollback()
+            if not slot_taken(e):
+                raise
+            # re-booking a slot somebody else holds now
+            return {"error": "That time slot is already booked."}, 409
         return {"message": "Appointment updated"}, 200
 
     def delete(self):
@@ -61,6 +101,72 @@ class AppointmentAPI(Resource):
         return {"message": "Appointment deleted"}, 200
 
 
+# many create/update/delete operations in one transaction
+class AppointmentBatchAPI(Resource):
+    def post(self):
+        data = request.get_json(silent=True)
+        operations = data.get('operations') if isinstance(data, dict) else data
+        if not isinstance(operations, list):
+            return {"error": "Expected a list of operations"}, 400
+
+        limit = current_app.config.get('MAX_BATCH_SIZE', 1000)
+        if len(operations) > limit:
+            return {"error": f"At most {limit} operations per batch"}, 413
+
+        atomic = isinstance(data, dict) and bool(data.get('atomic'))
+        try:
+            results = apply_batch(operations, atomic=atomic)
+        except IntegrityError as e:
+            db.session.rollback()
+            if not slot_taken(e):
+                raise
+            # a concurrent writer took one of the slots between our check and commit
+            return {"error": "A time slot in the batch was booked concurrently, nothing was applied."}, 409
+        return {"results": results}, 200
+
+
+# front desk: doctors free at ?at=<datetime>, or their free slots between
+# ?start= and ?end=; ?department_id= narrows it to one department
+class FreeDoctorsAPI(Resource):
+    def get(self):
+        try:
+            at = request.args.get('at')
+            start = datetime.fromisoformat(at or request.args['start'])
+            end = datetime.fromisoformat(request.args['end']) if not at else None
+            department_id = request.args.get('department_id', type=int)
+        except (KeyError, ValueError):
+            return {"error": "Give at=<datetime>, or start=<datetime> and end=<datetime>"}, 400
+
+        if at:
+            free = dict.fromkeys(availability_index.free_at(start))
+        else:
+            if end <= start or end - start > timedelta(days=availability_index.max_days):
+                return {"error": f"end must be after start and at most {availability_index.max_days} days later"}, 400
+            free = availability_index.free_between(start, end)
+
+        doctors = doctors_by_id(free, department_id)
+        results = []
+        for doctor_id in sorted(doctors):
+            d = doctors[doctor_id]
+            result = {"id": d.id, "name": f"{d.first_name} {d.last_name}",
+                      "department": d.specialization.name if d.specialization else None}
+            if not at:
+                result["slots"] = [slot.isoformat() for slot in free[doctor_id]]
+            results.append(result)
+        return results, 200
+
+
+# the next free slots with any doctor of a department, earliest first (?count=)
+class FirstAvailableAPI(Resource):
+    def get(self, department_id):
+        slots = first_available.get(department_id, request.args.get('count', type=int))
+        return [{"datetime": slot.isoformat(), "doctor_id": doctor_id, "doctor": doctor_name}
+                for slot, doctor_id, doctor_name in slots], 200
+
+
 api.add_resource(DoctorList, '/doctors')
 api.add_resource(PatientList, '/patients')
 api.add_resource(AppointmentAPI, '/appointments')
+api.add_resource(AppointmentBatchAPI, '/appointments/batch')
+api.add_resource(FreeDoctorsAPI, '/availability/free')
+api.add_resource(FirstAvailableAPI, '/departments/<int:department_id>/first_available')
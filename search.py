@@ -0,0 +1,135 @@
+# doctor/patient lookup.
+# on sqlite with FTS5 the user_search table holds one row per user (rowid = users.id)
+# and is kept in sync by triggers, so searches are prefix matches on an inverted
+# index ranked by bm25. other databases fall back to ILIKE over the same fields.
+import re
+
+from flask import current_app
+from sqlalchemy import or_, text
+
+from models import db, User, Department
+
+PATIENT_FIELDS = ('name', 'email', 'contact')
+DOCTOR_FIELDS = ('name', 'qualification')
+DOCTOR_DEPARTMENT_FIELDS = ('name', 'qualification', 'department')
+
+# the indexed text of one user, for `users` aliased as u and `departments` as d
+_ROW = """
+    u.first_name || ' ' || u.last_name, u.email, coalesce(u.contact_number, ''),
+    coalesce(u.qualification, ''), coalesce(d.name || ' ' || coalesce(d.description, ''), ''), u.role
+"""
+_COLUMNS = 'name, email, contact, qualification, department, role'
+
+SEARCH_INDEX_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS user_search USING fts5(
+        {_COLUMNS.replace('role', 'role UNINDEXED')},
+        tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS users_search_insert AFTER INSERT ON users BEGIN
+        INSERT INTO user_search(rowid, {_COLUMNS})
+        SELECT u.id, {_ROW} FROM users u LEFT JOIN departments d ON d.id = u.specialization_id
+        WHERE u.id = new.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS users_search_update AFTER UPDATE ON users BEGIN
+        DELETE FROM user_search WHERE rowid = old.id;
+        INSERT INTO user_search(rowid, {_COLUMNS})
+        SELECT u.id, {_ROW} FROM users u LEFT JOIN departments d ON d.id = u.specialization_id
+        WHERE u.id = new.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS users_search_delete AFTER DELETE ON users BEGIN
+        DELETE FROM user_search WHERE rowid = old.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS departments_search_update AFTER UPDATE ON departments BEGIN
+        UPDATE user_search SET department = new.name || ' ' || coalesce(new.description, '')
+        WHERE rowid IN (SELECT id FROM users WHERE specialization_id = new.id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS departments_search_delete AFTER DELETE ON departments BEGIN
+        UPDATE user_search SET department = ''
+        WHERE rowid IN (SELECT id FROM users WHERE specialization_id = old.id);
+    END""",
+]
+
+_fts_engines = {}
+
+
+def fts_supported(conn):
+    if conn.dialect.name != 'sqlite':
+        return False
+    return bool(conn.execute(text("SELECT sqlite_compileoption_used('ENABLE_FTS5')")).scalar())
+
+
+# migration: build the index and its triggers, then load the existing users
+def create_search_index(conn):
+    if not fts_supported(conn):
+        return
+    for statement in SEARCH_INDEX_DDL:
+        conn.execute(text(statement))
+    conn.execute(text('DELETE FROM user_search'))
+    conn.execute(text(f"""
+        INSERT INTO user_search(rowid, {_COLUMNS})
+        SELECT u.id, {_ROW} FROM users u LEFT JOIN departments d ON d.id = u.specialization_id
+    """))
+
+
+def has_search_index():
+    engine = db.engine
+    if engine.url not in _fts_engines:
+        with engine.connect() as conn:
+            _fts_engines[engine.url] = fts_supported(conn) and conn.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'user_search'"
+            )).first() is not None
+    return _fts_engines[engine.url]
+
+
+# 'dr. greg ho' -> '{name qualification} : ("dr"* "greg"* "ho"*)'
+def match_expression(query, fields):
+    terms = re.findall(r'\w+', query.lower())
+    if not terms:
+        return None
+    return '{%s} : (%s)' % (' '.join(fields), ' '.join(f'"{term}"*' for term in terms))
+
+
+def _fts_search(query, role, fields, limit):
+    expression = match_expression(query, fields)
+    if expression is None:
+        return []
+
+    ids = db.session.execute(text(
+        'SELECT rowid FROM user_search WHERE user_search MATCH :q AND role = :role '
+        'ORDER BY rank LIMIT :limit'
+    ), {'q': expression, 'role': role, 'limit': limit}).scalars().all()
+    if not ids:
+        return []
+
+    users = {u.id: u for u in User.query.filter(User.id.in_(ids))}
+    return [users[i] for i in ids if i in users]
+
+
+def _like_search(query, role, fields, limit):
+    pattern = f'%{query}%'
+    columns = {
+        'name': User.first_name + ' ' + User.last_name,
+        'email': User.email,
+        'contact': User.contact_number,
+        'qualification': User.qualification,
+        'department': Department.name,
+    }
+    conditions = [columns[field].ilike(pattern) for field in fields]
+    if 'department' in fields:
+        conditions.append(Department.description.ilike(pattern))
+
+    results = User.query.filter(User.role == role)
+    if 'department' in fields:
+        results = results.outerjoin(Department, User.specialization_id == Department.id)
+    return results.filter(or_(*conditions)).order_by(User.first_name, User.id).limit(limit).all()
+
+
+# users with the given role matching every word of `query` (as a prefix), best first
+def search_users(query, role, fields, limit=None):
+    limit = limit or current_app.config.get('SEARCH_LIMIT', 100)
+    query = query.strip()
+    if not query:
+        return []
+    if has_search_index():
+        return _fts_search(query, role, fields, limit)
+    return _like_search(query, role, fields, limit)
@@ -0,0 +1,99 @@
+# compact json for the api's list endpoints.
+# a resource's fields map to the columns they are built from, so a page is
+# read as plain row tuples - only the columns the requested fields need, no
+# User or Appointment objects - and turned into dicts by position. bodies are
+# encoded with orjson when it is installed (several times faster than the
+# stdlib json module), and ?fields=id,name returns only those fields.
+import json
+from datetime import date, datetime
+from operator import itemgetter
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from models import User, Appointment
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not json serialisable')
+
+
+# bytes of json; datetimes as isoformat strings with either encoder
+def dumps(data):
+    if orjson is not None:
+        return orjson.dumps(data) + b'\n'
+    return (json.dumps(data, default=_default, separators=(',', ':')) + '\n').encode('utf-8')
+
+
+class Fields:
+    # fields: {name: (columns, format(*values) or None)}, in output order
+    def __init__(self, fields):
+        self.fields = fields
+
+    # ?fields=a,b -> the requested names in output order; unknown names are a ValueError
+    def parse(self, param):
+        if not param:
+            return tuple(self.fields)
+        wanted = {name.strip() for name in param.split(',') if name.strip()}
+        unknown = wanted - set(self.fields)
+        if unknown:
+            raise ValueError(f"unknown field(s): {', '.join(sorted(unknown))}; "
+                             f"choose from {', '.join(self.fields)}")
+        return tuple(name for name in self.fields if name in wanted)
+
+    # columns to select for these fields plus the pagination order's columns
+    def columns(self, names, order=()):
+        columns = {}
+        for name in names:
+            for column in self.fields[name][0]:
+                columns.setdefault(column.key, column)
+        for column, _ in order:
+            columns.setdefault(column.key, column)
+        return list(columns.values())
+
+    # rows selected with columns(names, ...) -> list of dicts
+    def dicts(self, rows, names, columns):
+        position = {column.key: i for i, column in enumerate(columns)}
+        getters = []
+        for name in names:
+            field_columns, fmt = self.fields[name]
+            get = itemgetter(*[position[column.key] for column in field_columns])
+            if fmt is not None:
+                get = _formatted(fmt, get, len(field_columns) > 1)
+            getters.append((name, get))
+        return [{name: get(row) for name, get in getters} for row in rows]
+
+
+def _formatted(fmt, get, several):
+    if several:
+        return lambda row: fmt(*get(row))
+    return lambda row: fmt(get(row))
+
+
+def _full_name(first_name, last_name):
+    return f'{first_name} {last_name}'
+
+
+DOCTOR = Fields({
+    'id': ((User.id,), None),
+    'name': ((User.first_name, User.last_name), _full_name),
+    'department': ((User.qualification,), None),
+})
+
+PATIENT = Fields({
+    'id': ((User.id,), None),
+    'name': ((User.first_name, User.last_name), _full_name),
+    'contact': ((User.contact_number,), None),
+})
+
+APPOINTMENT = Fields({
+    'id': ((Appointment.id,), None),
+    'doctor_id': ((Appointment.doctor_id,), None),
+    'patient_id': ((Appointment.patient_id,), None),
+    'datetime': ((Appointment.appointment_datetime,), None),
+    'status': ((Appointment.status,), None),
+})
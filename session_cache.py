@@ -0,0 +1,147 @@
+# per-process cache of the logged-in user for flask-login.
+# load_user runs on every authenticated request; instead of a full User row
+# (plus a lazy load for the department) it returns a small read-only snapshot
+# of the fields routes and templates use. entries expire after a TTL and are
+# dropped once a session that wrote to that user, or to any department,
+# commits. a snapshot loaded before such a commit is not stored.
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from itertools import chain
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, joinedload
+
+from models import db, User, Department
+
+Specialization = namedtuple('Specialization', 'id name')
+
+
+# User columns copied into the snapshot
+FIELDS = (
+    'id', 'email', 'first_name', 'last_name', 'role', 'contact_number', 'gender',
+    'dob', 'address', 'qualification', 'specialization_id', 'created_at',
+)
+
+
+class SessionUser:
+    __slots__ = FIELDS + ('specialization',)
+
+    # flask-login interface
+    is_authenticated = True
+    is_active = True
+    is_anonymous = False
+
+    def __init__(self, user):
+        for field in FIELDS:
+            setattr(self, field, getattr(user, field))
+        spec = user.specialization
+        self.specialization = Specialization(spec.id, spec.name) if spec else None
+
+    def get_id(self):
+        return str(self.id)
+
+    def __eq__(self, other):
+        return isinstance(other, (SessionUser, User)) and self.id == other.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __repr__(self):
+        return f'SessionUser {self.first_name}{self.last_name}({self.role})'
+
+
+class SessionUserCache:
+    def __init__(self, ttl=60, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()   # user id -> (SessionUser, expires_at)
+        self._generation = 0            # bumped by every invalidation
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.ttl = app.config.setdefault('SESSION_USER_TTL', self.ttl)
+        self.max_entries = app.config.setdefault('SESSION_USER_CACHE_SIZE', self.max_entries)
+
+    def get(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and entry[1] > now:
+                self._entries.move_to_end(user_id)
+                return entry[0]
+            generation = self._generation
+
+        user = db.session.get(User, user_id, options=[joinedload(User.specialization)])
+        if user is None:
+            self.invalidate(user_id)
+            return None
+
+        snapshot = SessionUser(user)
+        with self._lock:
+            # a write committed while we were loading: the row may be older than it
+            if generation != self._generation:
+                return snapshot
+            self._entries[user_id] = (snapshot, now + self.ttl)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return snapshot
+
+    def invalidate(self, *user_ids):
+        with self._lock:
+            self._generation += 1
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+
+session_users = SessionUserCache()
+
+
+# writes are noted as they are flushed and applied once the session commits:
+# dropping a snapshot earlier would let another request cache the old row
+# again before the new one is visible. a department write can rename every
+# doctor's specialization, so it drops them all
+def _note(session, user_ids=(), everyone=False):
+    stale = session.info.setdefault('session_users_stale', {'ids': set(), 'all': False})
+    stale['ids'].update(user_ids)
+    stale['all'] = stale['all'] or everyone
+
+
+@event.listens_for(Session, 'after_flush')
+def _note_flushed(session, flush_context):
+    changed = list(chain(session.dirty, session.deleted))
+    if any(isinstance(obj, Department) for obj in changed):
+        _note(session, everyone=True)
+    else:
+        user_ids = [obj.id for obj in changed if isinstance(obj, User)]
+        if user_ids:
+            _note(session, user_ids)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _note_bulk(orm_execute_state):
+    if orm_execute_state.is_update or orm_execute_state.is_delete:
+        if orm_execute_state.statement.table.name in (User.__tablename__, Department.__tablename__):
+            _note(orm_execute_state.session, everyone=True)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed(session):
+    stale = session.info.pop('session_users_stale', None)
+    if stale is None:
+        return
+    if stale['all']:
+        session_users.clear()
+    else:
+        session_users.invalidate(*stale['ids'])
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_rolled_back(session):
+    session.info.pop('session_users_stale', None)
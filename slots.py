@@ -0,0 +1,105 @@
+# appointment slot engine - free slots for a doctor in a date range
+from bisect import bisect_left
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from models import db, Appointment, DoctorAvailability
+
+
+def slot_length():
+    return current_app.config.get('APPOINTMENT_SLOT_MINUTES', 30)
+
+
+# booked appointment times for a doctor between two dates, sorted (one query)
+def booked_times(doctor_id, start_date, end_date):
+    start_dt = datetime.combine(start_date, datetime.min.time())
+    end_dt = datetime.combine(end_date + timedelta(days=1), datetime.min.time())
+
+    rows = db.session.query(Appointment.appointment_datetime).filter(
+        Appointment.doctor_id == doctor_id,
+        Appointment.status == 'Booked',
+        Appointment.appointment_datetime >= start_dt,
+        Appointment.appointment_datetime < end_dt,
+    ).order_by(Appointment.appointment_datetime).all()
+    return [when for when, in rows]
+
+
+# booked appointment times for several doctors in [start_dt, end_dt) as {doctor_id: [times]} (one query)
+def booked_times_for(doctor_ids, start_dt, end_dt):
+    rows = db.session.query(Appointment.doctor_id, Appointment.appointment_datetime).filter(
+        Appointment.doctor_id.in_(list(doctor_ids)),
+        Appointment.status == 'Booked',
+        Appointment.appointment_datetime >= start_dt,
+        Appointment.appointment_datetime < end_dt,
+    ).order_by(Appointment.appointment_datetime)
+    booked = {}
+    for doctor_id, when in rows:
+        booked.setdefault(doctor_id, []).append(when)
+    return booked
+
+
+# [(start, end)] -> sorted windows with overlapping or touching ones joined
+def merge_windows(windows):
+    merged = []
+    for start, end in sorted(windows):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+# availability windows for a doctor between two dates as (date, start, end) tuples (one query)
+def availability_windows(doctor_id, start_date, end_date):
+    return db.session.query(
+        DoctorAvailability.available_date,
+        DoctorAvailability.start_time,
+        DoctorAvailability.end_time,
+    ).filter(
+        DoctorAvailability.doctor_id == doctor_id,
+        DoctorAvailability.available_date.between(start_date, end_date),
+    ).order_by(DoctorAvailability.available_date, DoctorAvailability.start_time).all()
+
+
+# free slot datetimes in time order, produced lazily so a caller that needs
+# only the first few never cuts the rest. overlapping windows of a day are
+# merged first, so they give one slot grid instead of duplicate or staggered slots
+def iter_free_slots(windows, booked, minutes=30, after=None):
+    step = timedelta(minutes=minutes)
+    by_day = {}
+    for day, start, end in windows:
+        by_day.setdefault(day, []).append((start, end))
+
+    for day in sorted(by_day):
+        for start, end in merge_windows(by_day[day]):
+            current_slot = datetime.combine(day, start)
+            end_dt = datetime.combine(day, end)
+
+            while current_slot < end_dt:
+                # first booking at or after this slot; free if it starts after the slot ends
+                i = bisect_left(booked, current_slot)
+                taken = i < len(booked) and booked[i] < current_slot + step
+                if not taken and (after is None or current_slot >= after):
+                    yield current_slot
+                current_slot += step
+
+
+# split windows into slots and drop every slot that overlaps a booked time
+def subtract_booked(windows, booked, minutes=30):
+    free = {}
+    for slot in iter_free_slots(windows, booked, minutes):
+        free.setdefault(slot.date(), []).append(slot)
+    return free
+
+
+# {date: [slot datetimes]} of free slots - always two queries whatever the range
+def free_slots(doctor_id, start_date, end_date, minutes=None):
+    minutes = minutes or slot_length()
+    windows = availability_windows(doctor_id, start_date, end_date)
+    if not windows:
+        return {}
+
+    booked = booked_times(doctor_id, start_date, end_date)
+    return subtract_booked(windows, booked, minutes)
@@ -0,0 +1,84 @@
+# dashboard statistics, aggregated in the database with GROUP BY.
+# every function returns a short list of (label, count) tuples.
+from datetime import date
+
+from sqlalchemy import case, extract, func
+
+from models import db, User, Department, Appointment
+
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+AGE_EDGES = (18, 30, 45, 60)
+
+
+# number of users per role
+def role_counts():
+    rows = db.session.query(User.role, func.count(User.id)).group_by(User.role).all()
+    return dict(rows)
+
+
+# latest date of birth for someone who is at least `years` old today
+def _born_before(years, today):
+    try:
+        return today.replace(year=today.year - years)
+    except ValueError:
+        # 29 Feb in a non-leap year
+        return today.replace(year=today.year - years, day=28)
+
+
+# patients per age bucket, e.g. [('0-17', 4), ('18-29', 10), ..., ('60+', 2)]
+def age_buckets(edges=AGE_EDGES):
+    today = date.today()
+    labels = [f'0-{edges[0] - 1}']
+    labels += [f'{low}-{high - 1}' for low, high in zip(edges, edges[1:])]
+    labels.append(f'{edges[-1]}+')
+
+    # age >= n exactly when dob <= today minus n years, so buckets are plain date ranges
+    bucket = case(
+        *[(User.dob > _born_before(edge, today), label) for edge, label in zip(edges, labels)],
+        else_=labels[-1],
+    )
+    rows = (
+        db.session.query(bucket, func.count(User.id))
+        .filter(User.role == 'patient', User.dob.isnot(None), User.dob <= today)
+        .group_by(bucket)
+        .all()
+    )
+    counts = dict(rows)
+    return [(label, counts.get(label, 0)) for label in labels]
+
+
+# doctors per department, doctors without one counted as 'Unknown'
+def doctors_per_department():
+    name = func.coalesce(Department.name, 'Unknown')
+    return (
+        db.session.query(name, func.count(User.id))
+        .outerjoin(Department, User.specialization_id == Department.id)
+        .filter(User.role == 'doctor')
+        .group_by(name)
+        .order_by(name)
+        .all()
+    )
+
+
+# appointments per status, optionally for one doctor or patient
+def status_counts(doctor_id=None, patient_id=None):
+    query = db.session.query(Appointment.status, func.count(Appointment.id))
+    if doctor_id is not None:
+        query = query.filter(Appointment.doctor_id == doctor_id)
+    if patient_id is not None:
+        query = query.filter(Appointment.patient_id == patient_id)
+    return query.group_by(Appointment.status).order_by(Appointment.status).all()
+
+
+# appointments per weekday for a doctor, Monday first, days without any left out
+def weekday_histogram(doctor_id):
+    # day of week with 0 = Sunday
+    dow = extract('dow', Appointment.appointment_datetime)
+    rows = (
+        db.session.query(dow, func.count(Appointment.id))
+        .filter(Appointment.doctor_id == doctor_id)
+        .group_by(dow)
+        .all()
+    )
+    counts = {(int(day) - 1) % 7: count for day, count in rows}
+    return [(WEEKDAYS[i], counts[i]) for i in range(7) if i in counts]
@@ -0,0 +1,33 @@
+# background jobs run by jobs.job_queue; importing this module registers them
+from sqlalchemy import delete, or_, select
+
+from jobs import job_queue
+from models import db, User, Appointment, Treatment, DoctorAvailability
+
+
+# remove a user with everything that points at them: appointments (either
+# side) with their treatments, and a doctor's availability. deleted in batches,
+# each its own transaction, so a long history never holds the write lock for
+# long and a retry carries on where a failed attempt stopped
+@job_queue.task('delete_user')
+def delete_user(user_id, batch_size=1000):
+    counts = {'appointments': 0, 'treatments': 0, 'availability': 0}
+    appointment_ids = select(Appointment.id).where(
+        or_(Appointment.doctor_id == user_id, Appointment.patient_id == user_id)).limit(batch_size)
+
+    while ids := db.session.execute(appointment_ids).scalars().all():
+        counts['treatments'] += db.session.execute(
+            delete(Treatment).where(Treatment.appointment_id.in_(ids))).rowcount
+        counts['appointments'] += db.session.execute(
+            delete(Appointment).where(Appointment.id.in_(ids))).rowcount
+        db.session.commit()
+
+    counts['availability'] = db.session.execute(
+        delete(DoctorAvailability).where(DoctorAvailability.doctor_id == user_id)).rowcount
+
+    # through the session, so the logged-in user cache drops them too
+    user = db.session.get(User, user_id)
+    if user is not None:
+        db.session.delete(user)
+    db.session.commit()
+    return {'user_deleted': user is not None, **counts}
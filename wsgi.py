@@ -0,0 +1,6 @@
+# wsgi entry point, e.g. gunicorn wsgi:app (asgi.py serves the same app under uvicorn).
+# kept apart from app.py so importing the factory never creates an app, and
+# never migrates the default database
+from app import create_app
+
+app = create_app()